@@ -7,7 +7,13 @@ from dotenv import load_dotenv
 from datetime import datetime, timedelta
 from loguru import logger
 
+from client.modules.cache import cache
+from client.modules.mongo import MongoClient, set_mongo
+from client.mongo_modules.indexes import setup_indexes
+from client.mongo_modules.replica import close_replicas, start_replicas
 from client.modules.redis_client import RedisClient
+from client.modules.redis_lock import LeaderElection
+from client.modules.chat_relay import ChatRelay
 from client.events.on_message import handle_message
 from client.modules.ticket import ticket_setup
 from client.commands.system import setup as system_setup
@@ -74,6 +80,9 @@ class DiscordClient(discord.Client):
         self.tree = app_commands.CommandTree(self)
         self.token = os.getenv("DISCORD_TOKEN")
         self.redis_client = RedisClient()
+        self.mongo = MongoClient()
+        self.leader = LeaderElection(self.redis_client, "bot")
+        self.chat_relay = ChatRelay(self)
         self.preset_guild_id = os.getenv("GUILD_ID")
         self.selected_guild = None
 
@@ -99,9 +108,27 @@ class DiscordClient(discord.Client):
         logger.info(f"Commands loaded: {result}")
 
     async def setup_hook(self):
+        set_mongo(self.mongo)
+        await self.mongo.connect()
+        await setup_indexes(self.mongo)
+        start_replicas(self.mongo)
         await self.redis_client.connect()
+        await cache.attach(self.redis_client)
+        await self.leader.start()
+        # Replicas all handle events, background loops only run on the leader
+        self.leader.run(lambda: ticket_cleanup_task(self))
         await self.set_guild()
         await self.load_commands()
+        self.chat_relay.start()
+
+    async def close(self):
+        await super().close()
+        await self.chat_relay.close()
+        await self.leader.close()
+        await self.redis_client.close()
+        await close_replicas()
+        await self.mongo.close()
+        set_mongo(None)
 
     async def on_message(self, message: discord.Message):
         await handle_message(self, message)
@@ -154,4 +181,3 @@ class DiscordClient(discord.Client):
 
     async def on_ready(self):
         logger.info(f"Bot is ready as {self.user} at {datetime.now()}")
-        self.loop.create_task(ticket_cleanup_task(self))
@@ -6,6 +6,7 @@ from json import JSONDecodeError
 from discord import app_commands
 from discord.ui import View
 from .groups.raffle import Raffle
+from ..modules.cache import cache
 from loguru import logger
 from datetime import datetime, timezone
 
@@ -43,6 +44,13 @@ async def _read_json():
 
 async def _write_json(data: dict):
     await asyncio.to_thread(_sync_write_json, data)
+    await cache.invalidate("raffle")
+
+
+@cache.cached("raffle", ttl=3600, shared=False)
+async def _read_cached_json():
+    """Raffle data for display, shared with other callers so never mutate it."""
+    return await _read_json()
 
 
 def discord_timestamp(iso_string: str | None, style: str = "R") -> str:
@@ -87,7 +95,7 @@ class RaffleView(View):
             if not guild:
                 return
 
-            data = await _read_json()
+            data = await _read_cached_json()
             tickets_data = data.get("tickets", {})
             donations_data = data.get("donations", {})
 
@@ -270,7 +278,7 @@ async def _update_view():
 async def _restore_persistent_view(client: discord.Client):
     global persistent_view_message
 
-    data = await _read_json()
+    data = await _read_cached_json()
     info = data.get("persistent_message")
     if not info:
         return
@@ -593,7 +601,7 @@ async def audit(
 ):
     """Show raffle transactions with optional filters"""
 
-    data = await _read_json()
+    data = await _read_cached_json()
     transactions = data.get("transactions", [])
 
     if not transactions:
@@ -702,7 +710,7 @@ async def audit(
 async def audit_summary(interaction: discord.Interaction):
     """Show a summary of handlers and which users they have handled"""
 
-    data = await _read_json()
+    data = await _read_cached_json()
     tickets_data = data.get("tickets", {})
     donations_data = data.get("donations", {})
 
@@ -799,4 +807,5 @@ async def audit_summary(interaction: discord.Interaction):
 
 async def setup(client: discord.Client, guild: discord.Guild):
     client.tree.add_command(raffle, guild=guild)
-    client.loop.create_task(_restore_persistent_view(client))
+    # Only the leader edits the persistent message
+    client.leader.run(lambda: _restore_persistent_view(client))
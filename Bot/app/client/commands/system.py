@@ -1,28 +1,45 @@
 import discord
+import io
+import json
 import os
 
 from dotenv import load_dotenv
 
 from discord import app_commands
 from .groups.system import System
-from ..modules.mongo import MongoClient
+from ..modules.cache import cache
+from ..modules.mongo import get_mongo
+from ..mongo_modules import replica
 
 load_dotenv()
-mongodb = MongoClient()
 system = System()
 
 owner = os.getenv("OWNER_ID")
 
 
-async def check_sysadmin(interaction: discord.Interaction) -> bool:
-    _user = await mongodb.get_document(
-        collection="Users", query={"_id": str(interaction.user.id)}
-    )
-    if _user:
-        return _user["individual_permissions"]["sysadmin"]
+def _has_sysadmin(user: dict | None) -> bool:
+    if user:
+        # Users linked without permissions store None here
+        return bool((user.get("individual_permissions") or {}).get("sysadmin"))
     return False
 
 
+@cache.cached("sysadmin", ttl=3600)
+async def is_sysadmin(user_id: int) -> bool:
+    _user = await get_mongo().get_document(
+        collection="Users",
+        query={"_id": user_id},
+        projection={"individual_permissions": 1},
+    )
+    return _has_sysadmin(_user)
+
+
+async def check_sysadmin(interaction: discord.Interaction) -> bool:
+    if replica.users.ready:
+        return _has_sysadmin(replica.users.get(interaction.user.id))
+    return await is_sysadmin(interaction.user.id)
+
+
 @system.command()
 async def add_system_user(interaction: discord.Interaction, user: discord.User = None):
     """
@@ -37,12 +54,19 @@ async def add_system_user(interaction: discord.Interaction, user: discord.User =
         return
     if not user:
         user = interaction.user
-    _user = await mongodb.get_document(collection="Users", query={"_id": str(user.id)})
+    _user = await get_mongo().get_document(
+        collection="Users",
+        query={"_id": user.id},
+        projection={"individual_permissions": 1},
+    )
     if _user:
-        _user["individual_permissions"]["sysadmin"] = True
-        await mongodb.update_document(
-            collection="Users", query={"_id": str(user.id)}, update=_user
+        permissions = _user.get("individual_permissions") or {}
+        await get_mongo().update_document(
+            collection="Users",
+            query={"_id": user.id},
+            update={"individual_permissions": {**permissions, "sysadmin": True}},
         )
+        await is_sysadmin.invalidate(user.id)
         await interaction.response.send_message(
             "User permissions updated successfully", ephemeral=True
         )
@@ -55,16 +79,19 @@ async def add_system_user(interaction: discord.Interaction, user: discord.User =
 @system.command()
 @app_commands.check(check_sysadmin)
 async def whitelist_link(interaction: discord.Interaction, link: str):
-    await mongodb.insert_document(
+    await get_mongo().insert_document(
         collection="System", document={"tag": "whitelisted_url", "url": link}
     )
+    await cache.invalidate("whitelist")
     await interaction.response.send_message(f"{link} whitelisted.", ephemeral=True)
 
 
 @system.command()
 async def get_whitelisted_links(interaction: discord.Interaction):
-    links = await mongodb.get_many(
-        collection="System", query={"tag": "whitelisted_url"}
+    links = await get_mongo().get_many(
+        collection="System",
+        query={"tag": "whitelisted_url"},
+        projection={"_id": 0, "url": 1},
     )
     if not links:
         await interaction.response.send_message(
@@ -77,5 +104,35 @@ async def get_whitelisted_links(interaction: discord.Interaction):
     )
 
 
+@system.command()
+@app_commands.check(check_sysadmin)
+async def stats(interaction: discord.Interaction):
+    """Shows redis, cache and replica stats for this bot instance."""
+    client = interaction.client
+    report = json.dumps(
+        {
+            "redis": client.redis_client.stats(),
+            "subscriptions": client.redis_client.dispatcher.stats(),
+            "leader": client.leader.stats(),
+            "chat_relay": (
+                client.chat_relay.consumer.stats()
+                if client.chat_relay.consumer
+                else None
+            ),
+            "cache": cache.stats(),
+            "replicas": [r.stats() for r in replica.REPLICAS],
+        },
+        indent=2,
+        default=str,
+    )
+    if len(report) > 1900:
+        await interaction.response.send_message(
+            file=discord.File(io.BytesIO(report.encode()), "stats.json"),
+            ephemeral=True,
+        )
+        return
+    await interaction.response.send_message(f"```json\n{report}```", ephemeral=True)
+
+
 async def setup(client: discord.Client, guild: discord.Guild):
     client.tree.add_command(system, guild=guild)
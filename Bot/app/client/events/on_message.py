@@ -1,10 +1,11 @@
 import discord
 import re
-from cachetools import TTLCache, cached
 from loguru import logger
 from datetime import datetime
 
-from ..modules.mongo import MongoClient
+from ..modules.cache import cache
+from ..modules.mongo import get_mongo
+from ..mongo_modules import replica
 from ..modules.ticket_tracker import (
     last_activity,
     ticket_archive,
@@ -14,38 +15,41 @@ from ..modules.ticket_tracker import (
 )
 
 
-client = MongoClient()
-cache = TTLCache(maxsize=128, ttl=60)
 DISCORD_INVITE_REGEX = re.compile(
     r"(?:https?://)?(?:discord\.gg|discord\.com/invite)/([\w-]+)", re.IGNORECASE
 )
 
 
-@cached(cache)
-async def get_whitelisted_links() -> set[str] | None:
-    try:
-        links = await client.get_many(
-            collection="System", query={"tag": "whitelisted_url"}
-        )
-        if not links:
-            return None
+@cache.cached("whitelist", ttl=3600)
+async def get_whitelisted_links() -> list[str]:
+    links = await get_mongo().get_many(
+        collection="System",
+        query={"tag": "whitelisted_url"},
+        projection={"_id": 0, "url": 1},
+    )
+    return [doc["url"] for doc in links]
 
-        allowed_links = {doc["url"] for doc in links}
-        return allowed_links
 
-    except Exception as e:
-        logger.debug(f"Error getting links: {e}")
+async def whitelisted_links() -> list[str]:
+    if replica.system.ready:
+        links = replica.system.find(lambda doc: doc.get("tag") == "whitelisted_url")
+        return [doc["url"] for doc in links]
+    return await get_whitelisted_links()
 
 
 async def check_allowed_links(message: discord.Message) -> set[str] | None:
-    offending_links = set()
-    allowed_links = await get_whitelisted_links()
+    message_links = set(re.findall(DISCORD_INVITE_REGEX, message.content))
+    # Most messages have no invite links, don't look the whitelist up for them
+    if not message_links:
+        return
+    try:
+        allowed_links = await whitelisted_links()
+    except Exception as e:
+        logger.debug(f"Error getting links: {e}")
+        return
     if not allowed_links:
         return
-    message_links = set(re.findall(DISCORD_INVITE_REGEX, message.content))
-    for link in message_links:
-        if link not in allowed_links:
-            offending_links.add(link)
+    offending_links = message_links.difference(allowed_links)
     if offending_links:
         return offending_links
     return
@@ -65,6 +69,7 @@ async def handle_message(client: discord.Client, message: discord.Message):
         )
         await message.delete()
         return
+    await client.chat_relay.relay_to_game(message)
     if message.channel.category_id == ticket_category.id:  # type: ignore
         if message.channel.id in [ticket_archive.id, ticket_origin.id]:
             return
@@ -0,0 +1,304 @@
+import asyncio
+import functools
+import os
+import socket
+import time
+import uuid
+
+import redis
+from typing import Any, Awaitable, Callable
+from cachetools import TLRUCache
+from dotenv import load_dotenv
+from loguru import logger
+
+from .payloads import CacheInvalidation
+from .settings import env_int
+
+load_dotenv()
+
+Loader = Callable[[], Awaitable[Any]]
+
+# Stores an entry only if its namespace version is still the one read before
+# loading it, so a load that raced an invalidation can't write back stale data.
+STORE = """
+if (redis.call('GET', KEYS[2]) or '0') ~= ARGV[3] then
+    return 0
+end
+redis.call('SET', KEYS[1], ARGV[1], 'PX', ARGV[2])
+if KEYS[3] then
+    redis.call('SADD', KEYS[3], ARGV[4])
+end
+return 1
+"""
+
+
+class _Entry:
+    __slots__ = ("value", "fresh_until", "stale_until")
+
+    def __init__(self, value: Any, fresh_until: float, stale_until: float):
+        self.value = value
+        self.fresh_until = fresh_until
+        self.stale_until = stale_until
+
+
+class SharedCache:
+    """
+    Two tier cache for async lookups.
+
+    L1 is an in-process LRU holding each entry until it goes stale. L2 is
+    redis, shared by every replica, used once `redis_client` is set and for
+    namespaces cached with `shared`. Concurrent misses for a key share one
+    call to the loader. Entries past their `ttl` but within `stale_ttl` are
+    served as-is while a single background call refreshes them.
+
+    Keys are `namespace:arg:arg`, `invalidate` drops exact keys or every key
+    in a namespace from both tiers and broadcasts them on `channel` so every
+    other process drops them from its L1 too. Invalidating also bumps a
+    version per namespace in redis, and loads only write to L2 if the version
+    they read before loading is unchanged. A process that lost redis may
+    have missed broadcasts, it empties its L1 when redis comes back. Loader
+    exceptions are never cached, redis errors only ever cost an L2 miss.
+    """
+
+    prefix = "cache:"
+    channel = "cache:invalidate"
+
+    def __init__(self, maxsize: int = env_int("BOT_CACHE_SIZE", 4096)):
+        self.l1 = TLRUCache(
+            maxsize, ttu=lambda _key, entry, _now: entry.stale_until, timer=time.time
+        )
+        self.redis_client = None
+        self.origin = f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self.inflight: dict[str, asyncio.Task] = {}
+        self._store = None
+        # Bumped on every invalidation so loads started before it don't store stale results
+        self.generation = 0
+        self.counters = {
+            "l1_hits": 0,
+            "l2_hits": 0,
+            "misses": 0,
+            "stale": 0,
+            "coalesced": 0,
+            "load_errors": 0,
+            "invalidations": 0,
+            "stale_writes": 0,
+            "remote_invalidations": 0,
+            "resyncs": 0,
+        }
+
+    async def attach(self, redis_client) -> None:
+        """Share entries and invalidations through redis."""
+        self.redis_client = redis_client
+        redis_client.on_reconnect.append(self._resync)
+        await redis_client.subscribe(self.channel, self._on_invalidation, decode=True)
+
+    async def _on_invalidation(self, channel: str, message: CacheInvalidation) -> None:
+        if not isinstance(message, CacheInvalidation) or message.origin == self.origin:
+            return
+        self.counters["remote_invalidations"] += len(message.keys)
+        self._evict(message.keys)
+
+    async def _resync(self) -> None:
+        self.counters["resyncs"] += 1
+        self.generation += 1
+        self.l1.clear()
+
+    @staticmethod
+    def key(namespace: str, *args) -> str:
+        return ":".join([namespace, *map(str, args)])
+
+    def cached(self, namespace: str, ttl: float, stale_ttl: float = 0, shared: bool = True):
+        """
+        Cache an async function by its positional arguments.
+
+        The wrapped function gets an `invalidate(*args)` coroutine, without
+        arguments it drops the whole namespace.
+        """
+
+        def decorator(func: Callable[..., Awaitable[Any]]):
+            @functools.wraps(func)
+            async def wrapper(*args):
+                return await self.get(
+                    self.key(namespace, *args), lambda: func(*args), ttl, stale_ttl, shared
+                )
+
+            async def invalidate(*args) -> None:
+                await self.invalidate(self.key(namespace, *args))
+
+            wrapper.invalidate = invalidate
+            return wrapper
+
+        return decorator
+
+    async def get(
+        self,
+        key: str,
+        loader: Loader,
+        ttl: float,
+        stale_ttl: float = 0,
+        shared: bool = True,
+    ) -> Any:
+        entry = self.l1.get(key)
+        tier = "l1_hits"
+        if entry is None and shared:
+            entry = await self._l2_get(key)
+            tier = "l2_hits"
+            if entry is not None:
+                self.l1[key] = entry
+
+        if entry is not None:
+            now = time.time()
+            if now < entry.fresh_until:
+                self.counters[tier] += 1
+                return entry.value
+            if now < entry.stale_until:
+                self.counters["stale"] += 1
+                self._load(key, loader, ttl, stale_ttl, shared)
+                return entry.value
+
+        self.counters["misses"] += 1
+        return await asyncio.shield(self._load(key, loader, ttl, stale_ttl, shared))
+
+    def _load(
+        self, key: str, loader: Loader, ttl: float, stale_ttl: float, shared: bool
+    ) -> asyncio.Task:
+        task = self.inflight.get(key)
+        if task is not None:
+            self.counters["coalesced"] += 1
+            return task
+        task = asyncio.create_task(self._fill(key, loader, ttl, stale_ttl, shared))
+        self.inflight[key] = task
+        task.add_done_callback(functools.partial(self._loaded, key))
+        return task
+
+    def _loaded(self, key: str, task: asyncio.Task) -> None:
+        if self.inflight.get(key) is task:
+            del self.inflight[key]
+        if not task.cancelled() and task.exception() is not None:
+            self.counters["load_errors"] += 1
+            logger.debug(f"Loading {key} failed: {task.exception()}")
+
+    async def _fill(
+        self, key: str, loader: Loader, ttl: float, stale_ttl: float, shared: bool
+    ) -> Any:
+        generation = self.generation
+        version = await self._l2_version(key) if shared else None
+        value = await loader()
+        now = time.time()
+        entry = _Entry(value, now + ttl, now + ttl + stale_ttl)
+        if generation == self.generation:
+            self.l1[key] = entry
+            if version is not None:
+                await self._l2_set(key, entry, ttl + stale_ttl, version)
+        return value
+
+    @property
+    def _l2(self) -> bool:
+        return self.redis_client is not None and self.redis_client.healthy
+
+    @staticmethod
+    def _namespace(key: str) -> str:
+        return key.split(":", 1)[0]
+
+    async def _l2_version(self, key: str) -> str | None:
+        """The namespace version to store a load of `key` under, None to skip L2."""
+        if not self._l2:
+            return None
+        try:
+            version = await self.redis_client.call(
+                self.redis_client.client.get,
+                f"{self.prefix}gen:{self._namespace(key)}",
+            )
+        except redis.RedisError as e:
+            logger.debug(f"Shared cache version of {key} unavailable: {e}")
+            return None
+        return version.decode() if version else "0"
+
+    async def _l2_get(self, key: str) -> _Entry | None:
+        if not self._l2:
+            return None
+        try:
+            data = await self.redis_client.call(
+                self.redis_client.client.get, self.prefix + key
+            )
+            if data is None:
+                return None
+            value, fresh_until, stale_until = self.redis_client.serializer.loads(data)
+            return _Entry(value, fresh_until, stale_until)
+        except (redis.RedisError, ValueError) as e:
+            logger.debug(f"Shared cache read of {key} failed: {e}")
+            return None
+
+    async def _l2_set(
+        self, key: str, entry: _Entry, expires: float, version: str
+    ) -> None:
+        if not self._l2:
+            return
+        if self._store is None:
+            self._store = self.redis_client.client.register_script(STORE)
+        namespace = self._namespace(key)
+        keys = [self.prefix + key, f"{self.prefix}gen:{namespace}"]
+        # Index the key under its namespace so the namespace can be invalidated
+        if namespace != key:
+            keys.append(f"{self.prefix}index:{namespace}")
+        try:
+            data = self.redis_client.serializer.dumps(
+                [entry.value, entry.fresh_until, entry.stale_until]
+            )
+            stored = await self.redis_client.call(
+                self._store, keys=keys, args=[data, int(expires * 1000), version, key]
+            )
+        except (redis.RedisError, TypeError) as e:
+            logger.debug(f"Shared cache write of {key} failed: {e}")
+            return
+        if not stored:
+            self.counters["stale_writes"] += 1
+
+    def _evict(self, keys: list[str]) -> None:
+        self.generation += 1
+        for key in keys:
+            for cached in list(self.l1.keys()):
+                if cached == key or cached.startswith(key + ":"):
+                    self.l1.pop(cached, None)
+            self.inflight.pop(key, None)
+
+    async def invalidate(self, *keys: str) -> None:
+        """Drop keys, or whole namespaces, from both tiers in every process."""
+        self.counters["invalidations"] += len(keys)
+        self._evict(keys)
+
+        if not self._l2:
+            return
+        client = self.redis_client.client
+        try:
+            pipe = client.pipeline(transaction=False)
+            # Bump versions first so loads already running can't store their result
+            namespaces = {self._namespace(key) for key in keys}
+            for namespace in namespaces:
+                pipe.incr(f"{self.prefix}gen:{namespace}")
+            for key in keys:
+                pipe.smembers(f"{self.prefix}index:{key}")
+            indexed = (await self.redis_client.call(pipe.execute))[len(namespaces) :]
+            names = [self.prefix + key for key in keys]
+            names += [f"{self.prefix}index:{key}" for key in keys]
+            names += [self.prefix + member.decode() for members in indexed for member in members]
+            await self.redis_client.call(client.delete, *names)
+        except redis.RedisError as e:
+            logger.warning(f"Shared cache invalidation of {keys} failed: {e}")
+        # Still tell the other processes, their L1 copies are stale either way
+        try:
+            await self.redis_client.publish_object(
+                self.channel, CacheInvalidation(list(keys), self.origin)
+            )
+        except redis.RedisError as e:
+            logger.warning(f"Broadcasting invalidation of {keys} failed: {e}")
+
+    def stats(self) -> dict:
+        return {
+            "size": len(self.l1),
+            "inflight": len(self.inflight),
+            **self.counters,
+        }
+
+
+cache = SharedCache()
@@ -0,0 +1,116 @@
+import asyncio
+
+import discord
+from dotenv import load_dotenv
+from loguru import logger
+
+from .redis_streams import StreamConsumer
+from .settings import env, env_float, env_int
+from .trackscape import format_message
+
+load_dotenv()
+
+TO_DISCORD_STREAM = env("CHAT_TO_DISCORD_STREAM", "chat:to_discord")
+TO_RUNELITE_STREAM = env("CHAT_TO_RUNELITE_STREAM", "chat:to_runelite")
+MESSAGE_LIMIT = 2000
+
+
+def format_entry(entry: dict) -> str:
+    sender = discord.utils.escape_markdown(entry.get("sender", ""))
+    message = discord.utils.escape_markdown(entry.get("message", ""))
+    return f"**{sender}**: {message}"
+
+
+def merge_lines(lines: list[str]) -> list[str]:
+    """Pack lines into as few messages as fit discord's length limit."""
+    chunks, current, size = [], [], 0
+    for line in lines:
+        line = line[:MESSAGE_LIMIT]
+        if current and size + len(line) + 1 > MESSAGE_LIMIT:
+            chunks.append("\n".join(current))
+            current, size = [], 0
+        current.append(line)
+        size += len(line) + 1
+    if current:
+        chunks.append("\n".join(current))
+    return chunks
+
+
+class ChatRelay:
+    """
+    Relays clan chat between the chat service and a discord channel.
+
+    Chat appends deduped entries to TO_DISCORD_STREAM, consumed here as the
+    "bot" group. Everything read in one interval is merged into as few
+    discord messages as possible and only acked once sent. Messages posted in
+    the relay channel go the other way through TO_RUNELITE_STREAM.
+    """
+
+    group = "bot"
+
+    def __init__(self, client: discord.Client):
+        self.client = client
+        self.channel_id = env_int("CHAT_RELAY_CHANNEL_ID", 0)
+        self.interval = env_float("CHAT_RELAY_INTERVAL", 2)
+        self.maxlen = env_int("CHAT_RELAY_MAXLEN", 10000)
+        self.channel: discord.abc.Messageable | None = None
+        self.consumer: StreamConsumer | None = None
+        self.task: asyncio.Task | None = None
+
+    def start(self) -> None:
+        if not self.channel_id:
+            logger.warning("CHAT_RELAY_CHANNEL_ID not set, chat relay disabled")
+            return
+        if not self.task:
+            self.task = asyncio.create_task(self._start_consumer())
+
+    async def _start_consumer(self) -> None:
+        await self.client.wait_until_ready()
+        self.channel = self.client.get_channel(self.channel_id)
+        if self.channel is None:
+            logger.error(f"Chat relay channel {self.channel_id} not found")
+            return
+        self.consumer = StreamConsumer(
+            self.client.redis_client,
+            TO_DISCORD_STREAM,
+            self.group,
+            self.relay_to_discord,
+            batch_size=500,
+            min_interval=self.interval,
+        )
+        self.consumer.start()
+
+    async def relay_to_discord(self, stream_entries: list[tuple[str, dict]]) -> None:
+        # Chat writes plain JSON, not envelopes
+        codec = self.client.redis_client.serializer.json
+        lines = []
+        for _, fields in stream_entries:
+            try:
+                lines.extend(format_entry(e) for e in codec.decode(fields["entries"]))
+            except (KeyError, ValueError) as e:
+                logger.warning(f"Skipping malformed relay entry: {e}")
+
+        for content in merge_lines(lines):
+            await self.channel.send(
+                content, allowed_mentions=discord.AllowedMentions.none()
+            )
+
+    async def relay_to_game(self, message: discord.Message) -> None:
+        if message.author.bot or message.channel.id != self.channel_id:
+            return
+        if not message.clean_content:
+            return
+        payload = await format_message(message)
+        redis_client = self.client.redis_client
+        try:
+            await redis_client.xadd(
+                TO_RUNELITE_STREAM,
+                {"payload": redis_client.serializer.json.encode(payload)},
+                maxlen=self.maxlen,
+            )
+        except Exception as e:
+            logger.error(f"Failed to relay message to game: {e}")
+
+    async def close(self) -> None:
+        if self.consumer:
+            await self.consumer.close()
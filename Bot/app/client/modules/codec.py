@@ -0,0 +1,195 @@
+import json
+from dataclasses import fields, is_dataclass
+from typing import Any
+
+from dotenv import load_dotenv
+from loguru import logger
+
+from .settings import env
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+load_dotenv()
+
+
+class CodecError(ValueError):
+    """Raised for payloads no registered codec can decode."""
+
+
+class Codec:
+    """
+    Turns plain data (dicts, lists, strings, numbers) into bytes and back.
+
+    `marker` is the byte that prefixes every envelope written with this codec,
+    codecs sharing a wire format share a marker so either can read the other.
+    """
+
+    name = ""
+    marker = b""
+
+    def __init__(self):
+        self.encoded = 0
+        self.encoded_bytes = 0
+        self.decoded = 0
+        self.decoded_bytes = 0
+
+    def encode(self, obj: Any) -> bytes:
+        data = self._encode(obj)
+        self.encoded += 1
+        self.encoded_bytes += len(data)
+        return data
+
+    def decode(self, data: bytes | str) -> Any:
+        obj = self._decode(data)
+        self.decoded += 1
+        self.decoded_bytes += len(data)
+        return obj
+
+    def _encode(self, obj: Any) -> bytes:
+        raise NotImplementedError
+
+    def _decode(self, data: bytes | str) -> Any:
+        raise NotImplementedError
+
+    def stats(self) -> dict:
+        return {
+            "encoded": self.encoded,
+            "encoded_bytes": self.encoded_bytes,
+            "decoded": self.decoded,
+            "decoded_bytes": self.decoded_bytes,
+        }
+
+
+class JsonCodec(Codec):
+    name = "json"
+    marker = b"j"
+
+    def _encode(self, obj: Any) -> bytes:
+        return json.dumps(obj, separators=(",", ":"), ensure_ascii=False).encode()
+
+    def _decode(self, data: bytes | str) -> Any:
+        return json.loads(data)
+
+
+class OrjsonCodec(JsonCodec):
+    name = "orjson"
+
+    def _encode(self, obj: Any) -> bytes:
+        return orjson.dumps(obj)
+
+    def _decode(self, data: bytes | str) -> Any:
+        return orjson.loads(data)
+
+
+class MsgpackCodec(Codec):
+    name = "msgpack"
+    marker = b"m"
+
+    def _encode(self, obj: Any) -> bytes:
+        return msgpack.packb(obj, use_bin_type=True)
+
+    def _decode(self, data: bytes | str) -> Any:
+        return msgpack.unpackb(data, raw=False)
+
+
+def available_codecs() -> dict[str, Codec]:
+    codecs = {"json": JsonCodec()}
+    if orjson is not None:
+        codecs["orjson"] = OrjsonCodec()
+    if msgpack is not None:
+        codecs["msgpack"] = MsgpackCodec()
+    return codecs
+
+
+# Schema tag -> (type, field names) for every registered payload type
+_schemas: dict[str, tuple[type, tuple[str, ...]]] = {}
+
+
+def schema(tag: str):
+    """
+    Register a dataclass as an envelope payload under `tag`.
+
+    Fields travel by position, only ever append new ones with defaults.
+    Changing or reordering existing fields needs a new tag (`chat.entry/2`).
+    """
+
+    def register(cls: type) -> type:
+        if not is_dataclass(cls):
+            raise TypeError(f"{cls.__name__} must be a dataclass to be a schema")
+        if tag in _schemas:
+            raise ValueError(f"Schema {tag} already registered to {_schemas[tag][0].__name__}")
+        _schemas[tag] = (cls, tuple(f.name for f in fields(cls)))
+        cls.__schema__ = tag
+        return cls
+
+    return register
+
+
+class Serializer:
+    """
+    Encodes objects into schema-tagged envelopes and decodes them back.
+
+    An envelope is one marker byte naming the wire format followed by the
+    encoded `[tag, data]` pair. Registered dataclasses are sent as their tag
+    and field values and rebuilt on the way in, anything else is sent
+    untagged as plain data. Decoding picks the codec from the marker, so a
+    process can switch `REDIS_CODEC` while others still read and write the
+    previous one.
+    """
+
+    def __init__(self, codec: str = env("REDIS_CODEC", "msgpack")):
+        self.codecs = available_codecs()
+        if codec not in self.codecs:
+            fallback = "orjson" if "orjson" in self.codecs else "json"
+            logger.warning(f"Codec {codec} unavailable, falling back to {fallback}")
+            codec = fallback
+        self.codec = self.codecs[codec]
+        # Fastest plain JSON available, for payloads shared with services that
+        # don't speak envelopes. orjson writes the same bytes as json so it
+        # also reads every json envelope.
+        self.json = self.codecs.get("orjson") or self.codecs["json"]
+        self.readers = {c.marker: c for c in self.codecs.values() if c.name != "json"}
+        self.readers[JsonCodec.marker] = self.json
+        self.unknown_schemas = 0
+
+    def dumps(self, obj: Any) -> bytes:
+        tag = getattr(type(obj), "__schema__", None)
+        if tag is not None:
+            names = _schemas[tag][1]
+            obj = [getattr(obj, name) for name in names]
+        return self.codec.marker + self.codec.encode([tag, obj])
+
+    def loads(self, data: bytes | str) -> Any:
+        if isinstance(data, str):
+            data = data.encode()
+        codec = self.readers.get(data[:1])
+        if codec is None:
+            raise CodecError(f"Unknown envelope marker {data[:1]!r}")
+        try:
+            tag, obj = codec.decode(data[1:])
+        except (ValueError, TypeError) as e:
+            raise CodecError(f"Malformed {codec.name} envelope: {e}") from e
+        if tag is None:
+            return obj
+        registered = _schemas.get(tag)
+        if registered is None:
+            # Published by a newer process, hand over the positional field values
+            self.unknown_schemas += 1
+            return obj
+        cls, names = registered
+        return cls(**dict(zip(names, obj)))
+
+    def stats(self) -> dict:
+        return {
+            "codec": self.codec.name,
+            "unknown_schemas": self.unknown_schemas,
+            **{name: codec.stats() for name, codec in self.codecs.items()},
+        }
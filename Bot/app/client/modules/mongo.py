@@ -1,83 +1,250 @@
 import os
-from typing import Optional, List, Dict, Any
-from pymongo import AsyncMongoClient
-from pymongo.results import InsertOneResult, UpdateResult, DeleteResult
+from dataclasses import dataclass, field
+from itertools import islice
+from typing import (
+    Optional,
+    List,
+    Dict,
+    Any,
+    AsyncIterator,
+    Awaitable,
+    Callable,
+    Iterable,
+    TypeVar,
+)
+from pymongo import AsyncMongoClient, InsertOne, UpdateOne
+from pymongo.asynchronous.client_session import AsyncClientSession
+from pymongo.errors import BulkWriteError
+from pymongo.results import (
+    BulkWriteResult,
+    InsertOneResult,
+    UpdateResult,
+    DeleteResult,
+)
 from pymongo.collection import Collection
 from dotenv import load_dotenv
 from loguru import logger
 
+from .settings import env_int
+
 load_dotenv()
 
+T = TypeVar("T")
+
+_shared: Optional["MongoClient"] = None
+
+BULK_CHUNK_SIZE = env_int("MONGO_BULK_CHUNK_SIZE", 1000)
+
+
+@dataclass
+class BulkResult:
+    """Totals of a chunked bulk write, error indexes are positions in the whole input."""
+
+    inserted: int = 0
+    matched: int = 0
+    modified: int = 0
+    deleted: int = 0
+    upserted: int = 0
+    upserted_ids: Dict[int, Any] = field(default_factory=dict)
+    errors: List[Dict[str, Any]] = field(default_factory=list)
+    chunks: int = 0
+
+    def add(self, result: BulkWriteResult, offset: int) -> None:
+        self.inserted += result.inserted_count
+        self.matched += result.matched_count
+        self.modified += result.modified_count
+        self.deleted += result.deleted_count
+        self.upserted += result.upserted_count
+        for index, _id in result.upserted_ids.items():
+            self.upserted_ids[offset + index] = _id
+
+    def add_error(self, details: Dict[str, Any], offset: int) -> None:
+        self.inserted += details.get("nInserted", 0)
+        self.matched += details.get("nMatched", 0)
+        self.modified += details.get("nModified", 0)
+        self.deleted += details.get("nRemoved", 0)
+        self.upserted += details.get("nUpserted", 0)
+        for upsert in details.get("upserted", []):
+            self.upserted_ids[offset + upsert["index"]] = upsert["_id"]
+        for error in details.get("writeErrors", []):
+            self.errors.append({**error, "index": offset + error["index"]})
+
+
+def get_mongo() -> "MongoClient":
+    """The process wide client, created and closed by `DiscordClient`."""
+    if _shared is None:
+        raise RuntimeError(
+            "MongoClient used before DiscordClient.setup_hook started it"
+        )
+    return _shared
+
+
+def set_mongo(client: Optional["MongoClient"]) -> None:
+    global _shared
+    _shared = client
+
 
 class MongoClient:
     """MongoDB client using PyMongo's async API (4.10.1)."""
 
     def __init__(self, db_name: str = os.getenv("DB_NAME")):
         self.uri: str = os.getenv("MONGO_URI", "")
-        self.client: AsyncMongoClient = AsyncMongoClient(self.uri)
+        self.client: AsyncMongoClient = AsyncMongoClient(
+            self.uri,
+            maxPoolSize=env_int("MONGO_MAX_POOL_SIZE", 20),
+            minPoolSize=env_int("MONGO_MIN_POOL_SIZE", 2),
+            maxIdleTimeMS=env_int("MONGO_MAX_IDLE_MS", 300000),
+            connectTimeoutMS=env_int("MONGO_CONNECT_TIMEOUT_MS", 5000),
+            socketTimeoutMS=env_int("MONGO_SOCKET_TIMEOUT_MS", 10000),
+            serverSelectionTimeoutMS=env_int("MONGO_SERVER_SELECTION_TIMEOUT_MS", 5000),
+        )
         self.db = self.client[db_name]
         logger.debug(f"MongoClient initialized with DB: {db_name}")
 
+    async def connect(self) -> None:
+        """Warm up the pool so the first command doesn't pay for discovery and the handshake."""
+        try:
+            await self.db.command("ping")
+            logger.success("Connected to MongoDB")
+        except Exception as e:
+            # The driver keeps retrying in the background, commands wait for it
+            logger.error(f"Could not reach MongoDB at startup: {e}")
+
     async def close(self) -> None:
         """Close the MongoDB connection."""
         await self.client.close()
         logger.debug("MongoDB connection closed.")
 
+    async def run_transaction(
+        self, callback: Callable[[AsyncClientSession], Awaitable[T]]
+    ) -> T:
+        """Run `callback(session)` in one transaction, retried on transient errors."""
+        async with self.client.start_session() as session:
+            return await session.with_transaction(callback)
+
+    # Log calls pass arguments rather than f-strings, loguru only formats them
+    # when debug logging is on. Documents themselves are never logged.
+
     def get_collection(self, collection: str) -> Collection:
         """Retrieve a collection."""
-        logger.debug(f"Accessing collection: {collection}")
         return self.db[collection]
 
     async def get_document(
-        self, collection: str, query: Dict[str, Any]
+        self,
+        collection: str,
+        query: Dict[str, Any],
+        projection: Optional[Dict[str, Any]] = None,
     ) -> Optional[Dict[str, Any]]:
         """Retrieve a single document."""
-        logger.debug(f"Fetching one document from {collection} with query: {query}")
-        document = await self.get_collection(collection).find_one(query)
-        if document:
-            logger.debug(f"Document found: {document}")
-        else:
-            logger.debug("No document found.")
+        logger.debug("Fetching one document from {} with query: {}", collection, query)
+        document = await self.get_collection(collection).find_one(query, projection)
+        logger.debug("Document found: {}", document is not None)
         return document
 
+    def find(
+        self,
+        collection: str,
+        query: Dict[str, Any],
+        projection: Optional[Dict[str, Any]] = None,
+        sort: Optional[List[tuple[str, int]]] = None,
+        limit: int = 0,
+        batch_size: int = 0,
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Stream matching documents.
+
+        Only `batch_size` documents (the server default when 0) are held at a
+        time. Ask for just the fields needed with `projection`.
+        """
+        logger.debug("Streaming documents from {} with query: {}", collection, query)
+        cursor = self.get_collection(collection).find(
+            query, projection, limit=limit, batch_size=batch_size
+        )
+        if sort:
+            cursor = cursor.sort(sort)
+        return cursor
+
+    async def paginate(
+        self,
+        collection: str,
+        query: Dict[str, Any],
+        page_size: int = 100,
+        key: str = "_id",
+        after: Any = None,
+        descending: bool = False,
+        projection: Optional[Dict[str, Any]] = None,
+    ) -> AsyncIterator[List[Dict[str, Any]]]:
+        """
+        Yield pages of documents ordered by `key`, which must be unique and indexed.
+
+        Each page resumes past the last key of the previous one instead of
+        skipping, so every page costs the same however deep it is. Pass
+        `after` to resume from a key handed out earlier.
+        """
+        if projection is not None and projection.get(key) == 0:
+            raise ValueError(f"Pagination key {key} can't be projected out")
+        if projection and any(projection.values()):
+            projection = {**projection, key: 1}
+        direction = -1 if descending else 1
+        while True:
+            page_query = query
+            if after is not None:
+                bound = {"$lt" if descending else "$gt": after}
+                page_query = {"$and": [query, {key: bound}]}
+            page = await self.find(
+                collection,
+                page_query,
+                projection,
+                sort=[(key, direction)],
+                limit=page_size,
+                batch_size=page_size,
+            ).to_list(page_size)
+            if not page:
+                return
+            yield page
+            if len(page) < page_size:
+                return
+            after = page[-1][key]
+
     async def get_many(
-        self, collection: str, query: Dict[str, Any]
+        self,
+        collection: str,
+        query: Dict[str, Any],
+        projection: Optional[Dict[str, Any]] = None,
+        sort: Optional[List[tuple[str, int]]] = None,
+        limit: int = 0,
     ) -> List[Dict[str, Any]]:
-        """Retrieve multiple documents."""
-        logger.debug(
-            f"Fetching multiple documents from {collection} with query: {query}"
-        )
-        cursor = self.get_collection(collection).find(query)
-        documents = [doc async for doc in cursor]
-        logger.debug(f"Retrieved {len(documents)} documents.")
+        """Retrieve multiple documents, prefer `find` for large results."""
+        documents = await self.find(
+            collection, query, projection, sort=sort, limit=limit
+        ).to_list()
+        logger.debug("Retrieved {} documents.", len(documents))
         return documents
 
     async def get_count(self, collection: str, query: Dict[str, Any] = {}) -> int:
         """Count documents matching a query."""
-        logger.debug(f"Counting documents in {collection} with query: {query}")
+        logger.debug("Counting documents in {} with query: {}", collection, query)
         count = await self.get_collection(collection).count_documents(query)
-        logger.debug(f"Document count: {count}")
+        logger.debug("Document count: {}", count)
         return count
 
     async def insert_document(
         self, collection: str, document: Dict[str, Any]
     ) -> Optional[str]:
         """Insert a document and return its inserted ID."""
-        logger.debug(f"Inserting document into {collection}: {document}")
+        logger.debug("Inserting document into {}", collection)
         result: InsertOneResult = await self.get_collection(collection).insert_one(
             document
         )
         inserted_id = str(result.inserted_id) if result.inserted_id else None
-        logger.debug(f"Document inserted with ID: {inserted_id}")
+        logger.debug("Document inserted with ID: {}", inserted_id)
         return inserted_id
 
     async def update_document(
         self, collection: str, query: Dict[str, Any], update: Dict[str, Any]
     ) -> UpdateResult:
         """Update a document."""
-        logger.debug(
-            f"Updating document in {collection} with query: {query} and update: {update}"
-        )
+        logger.debug("Updating document in {} with query: {}", collection, query)
 
         # Check if update already has a `$` operator (like `$push`, `$inc`, etc.)
         if any(key.startswith("$") for key in update.keys()):
@@ -89,7 +256,9 @@ class MongoClient:
             query, update_query
         )
         logger.debug(
-            f"Matched {result.matched_count}, modified {result.modified_count} documents."
+            "Matched {}, modified {} documents.",
+            result.matched_count,
+            result.modified_count,
         )
         return result
 
@@ -97,7 +266,81 @@ class MongoClient:
         self, collection: str, query: Dict[str, Any]
     ) -> DeleteResult:
         """Delete a document."""
-        logger.debug(f"Deleting document from {collection} with query: {query}")
+        logger.debug("Deleting document from {} with query: {}", collection, query)
         result: DeleteResult = await self.get_collection(collection).delete_one(query)
-        logger.debug(f"Deleted {result.deleted_count} document(s).")
+        logger.debug("Deleted {} document(s).", result.deleted_count)
         return result
+
+    async def bulk_write(
+        self,
+        collection: str,
+        operations: Iterable[Any],
+        ordered: bool = True,
+        chunk_size: int = BULK_CHUNK_SIZE,
+    ) -> BulkResult:
+        """
+        Send write operations in chunks of `chunk_size`, one round trip each.
+
+        Failed writes are collected in `BulkResult.errors` rather than raised.
+        Ordered writes stop at the first failure, nothing after it is sent.
+        Unordered writes carry on with every other operation.
+        """
+        operations = iter(operations)
+        result = BulkResult()
+        offset = 0
+        while chunk := list(islice(operations, chunk_size)):
+            result.chunks += 1
+            try:
+                written = await self.get_collection(collection).bulk_write(
+                    chunk, ordered=ordered
+                )
+                result.add(written, offset)
+            except BulkWriteError as e:
+                result.add_error(e.details, offset)
+                if ordered:
+                    break
+            offset += len(chunk)
+        logger.debug(
+            "Bulk wrote to {} in {} chunks with {} errors.",
+            collection,
+            result.chunks,
+            len(result.errors),
+        )
+        return result
+
+    async def insert_many(
+        self,
+        collection: str,
+        documents: Iterable[Dict[str, Any]],
+        ordered: bool = False,
+        chunk_size: int = BULK_CHUNK_SIZE,
+    ) -> BulkResult:
+        """Insert documents in chunks."""
+        return await self.bulk_write(
+            collection, (InsertOne(doc) for doc in documents), ordered, chunk_size
+        )
+
+    async def upsert_many(
+        self,
+        collection: str,
+        documents: Iterable[Dict[str, Any]],
+        key: str = "_id",
+        ordered: bool = False,
+        chunk_size: int = BULK_CHUNK_SIZE,
+    ) -> BulkResult:
+        """
+        Insert or `$set` documents matched on `key`, in chunks.
+
+        `_id` can't be `$set`, when matching on another key it's only written
+        when the document is inserted.
+        """
+
+        def upsert(doc: Dict[str, Any]) -> UpdateOne:
+            update = {"$set": {k: v for k, v in doc.items() if k != "_id"}}
+            if key != "_id" and "_id" in doc:
+                update["$setOnInsert"] = {"_id": doc["_id"]}
+            return UpdateOne({key: doc[key]}, update, upsert=True)
+
+        return await self.bulk_write(
+            collection, (upsert(doc) for doc in documents), ordered, chunk_size
+        )
@@ -0,0 +1,31 @@
+from dataclasses import dataclass, field
+
+from .codec import schema
+
+
+@schema("chat.entry")
+@dataclass(slots=True)
+class ChatEntry:
+    clan_name: str
+    sender: str
+    message: str
+    rank: str | None = None
+    icon_id: int | None = None
+    is_league_world: bool = False
+
+
+@schema("raffle.event")
+@dataclass(slots=True)
+class RaffleEvent:
+    type: str
+    handler: str
+    target: str | None = None
+    amount: int | None = None
+    timestamp: str | None = None
+
+
+@schema("cache.invalidate")
+@dataclass(slots=True)
+class CacheInvalidation:
+    keys: list[str] = field(default_factory=list)
+    origin: str | None = None
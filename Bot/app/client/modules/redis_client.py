@@ -1,12 +1,23 @@
 import redis
 import redis.asyncio
 import asyncio
+import functools
 import os
+import random
+import time
 
+from typing import Any, Awaitable, Callable
 from dotenv import load_dotenv
 from loguru import logger
-from redis.asyncio import StrictRedis
-from redis.asyncio.client import PubSub
+from redis.asyncio import BlockingConnectionPool, StrictRedis
+
+from .codec import Serializer
+from .redis_dispatcher import Handler, SubscriptionDispatcher
+from .settings import env_float, env_int
+
+
+class RedisUnavailable(redis.ConnectionError):
+    """Raised without touching the network while the circuit breaker is open."""
 
 
 class RedisClient:
@@ -15,62 +26,379 @@ class RedisClient:
         self.host = os.getenv("REDIS_HOST")
         self.port = os.getenv("REDIS_PORT")
         self.password = os.getenv("REDIS_PASSWORD")
-        self.client = None
-        self.reconnect = False
-
-    # Connect to the redis cache, retrying with exponential backoff
-    async def connect(self) -> None:
-        retries = 0
-        while not self.client:
-            self.reconnect = True
-            try:
-                self.client = StrictRedis(
-                    host=self.host,
-                    port=self.port,
-                    password=self.password,
-                    decode_responses=True,
-                )
-                await self.client.ping()
-                logger.success("Connected to redis cache")
-                self.reconnect = False
-                return self.client
-            except (
-                redis.ConnectionError,
-                redis.TimeoutError,
-                redis.AuthenticationError,
-            ) as exc:
-                logger.error(exc)
-                self.client = None
-                retries += 1
+        self.pool_size = env_int("REDIS_POOL_SIZE", 20)
+        self.pool_timeout = env_float("REDIS_POOL_TIMEOUT", 2)
+        self.socket_timeout = env_float("REDIS_SOCKET_TIMEOUT", 5)
+        self.health_interval = env_float("REDIS_HEALTH_INTERVAL", 5)
+        self.max_backoff = env_float("REDIS_MAX_BACKOFF", 30)
+        self.pool: BlockingConnectionPool | None = None
+        self.client: StrictRedis | None = None
+        self.healthy = False
+        self.on_reconnect: list[Callable[[], Awaitable[None]]] = []
+        self.counters = {
+            "failures": 0,
+            "reconnects": 0,
+            "rejected": 0,
+            "pool_exhausted": 0,
+            "published_messages": 0,
+            "published_bytes": 0,
+        }
+        self._monitor: asyncio.Task | None = None
+        self.dispatcher = SubscriptionDispatcher(self)
+        self.serializer = Serializer()
+
+    # Build the connection pool and start monitoring it, never waits out an outage
+    async def connect(self) -> StrictRedis | None:
+        if self.pool is None:
+            self.pool = BlockingConnectionPool(
+                host=self.host,
+                port=self.port,
+                password=self.password,
+                # Payloads stay bytes so binary codecs survive the round trip,
+                # channel names and stream ids are decoded where they're routed
+                decode_responses=False,
+                max_connections=self.pool_size,
+                timeout=self.pool_timeout,
+                socket_timeout=self.socket_timeout,
+                socket_connect_timeout=self.socket_timeout,
+            )
+            self.client = StrictRedis(connection_pool=self.pool)
+
+        try:
+            await self.client.ping()
+            self._mark_up()
+        except (redis.ConnectionError, redis.TimeoutError) as exc:
+            self._mark_down(exc)
+
+        if not self._monitor:
+            self._monitor = asyncio.create_task(self._monitor_health())
+        self.dispatcher.start()
+        return self.client
+
+    def _mark_up(self) -> None:
+        if not self.healthy:
+            logger.success("Connected to redis cache")
+        self.healthy = True
+
+    def _mark_down(self, exc: Exception) -> None:
+        self.counters["failures"] += 1
+        if self.healthy:
+            logger.error(f"Lost connection to redis cache: {exc}")
+        self.healthy = False
+
+    def _pool_exhausted(self, exc: Exception) -> bool:
+        """Whether `exc` is the pool giving up waiting for a free connection."""
+        if isinstance(exc, redis.ConnectionError) and isinstance(
+            exc.__cause__, asyncio.TimeoutError
+        ):
+            self.counters["pool_exhausted"] += 1
+            return True
+        return False
+
+    # Ping while healthy, reconnect with jittered exponential backoff while not
+    async def _monitor_health(self) -> None:
+        attempt = 0
+        while True:
+            if self.healthy:
+                attempt = 0
+                await asyncio.sleep(self.health_interval)
+            else:
+                attempt += 1
+                delay = min(self.max_backoff, 2**attempt) * random.uniform(0.5, 1.5)
                 logger.warning(
-                    f"Could not connect to redis cache, retrying in {2**retries} seconds. {retries}/7"
+                    f"Could not connect to redis cache, retrying in {delay:.1f} seconds"
                 )
-                if retries >= 7:  # Exponential backoff, 2^7 = 128 seconds
-                    logger.error("Could not connect to redis cache, giving up")
-                    self.reconnect = False
-                    break
-                await asyncio.sleep(2**retries)
+                await asyncio.sleep(delay)
+
+            was_healthy = self.healthy
+            try:
+                await self.client.ping()
+            except (redis.ConnectionError, redis.TimeoutError) as exc:
+                if self._pool_exhausted(exc):
+                    # Busy, not down, every connection is in use
+                    continue
+                self._mark_down(exc)
+                await self.pool.disconnect(inuse_connections=False)
                 continue
 
-    async def subscribe(self, channel: str) -> PubSub:
-        if not self.client and not self.reconnect:
-            await self.connect()
+            self._mark_up()
+            if not was_healthy:
+                self.counters["reconnects"] += 1
+                for callback in self.on_reconnect:
+                    try:
+                        await callback()
+                    except Exception as e:
+                        logger.error(f"Redis reconnect callback failed: {e}")
+
+    def _check_available(self) -> None:
+        if not self.healthy or self.client is None:
+            self.counters["rejected"] += 1
+            raise RedisUnavailable("Redis cache unavailable")
+
+    async def call(self, command: Callable[..., Awaitable[Any]], *args, **kwargs) -> Any:
+        """
+        Run a client command behind the circuit breaker.
 
-        logger.info(f"Subscribing to {channel}")
-        sub = self.client.pubsub()
-        await sub.subscribe(channel)
-        return sub
+        Fails fast with `RedisUnavailable` while redis is down, and opens the
+        circuit when a command hits a connection error. Timing out while
+        waiting for a free pooled connection is re-raised as is, redis is
+        busy rather than down.
+        """
+        self._check_available()
+        try:
+            return await command(*args, **kwargs)
+        except (redis.ConnectionError, redis.TimeoutError) as exc:
+            if not self._pool_exhausted(exc):
+                self._mark_down(exc)
+            raise
+
+    async def subscribe(
+        self, channel: str, handler: Handler, queue_size: int = 1000, decode: bool = False
+    ) -> None:
+        """
+        Route messages on `channel` to `handler(channel, data)`.
+
+        `data` is the raw bytes published, or with `decode` the object
+        published through `publish_object`.
+        """
+        if decode:
+            handler = self._decoding(handler)
+        await self.dispatcher.subscribe(channel, handler, queue_size)
+
+    async def psubscribe(
+        self, pattern: str, handler: Handler, queue_size: int = 1000, decode: bool = False
+    ) -> None:
+        """Route messages on channels matching `pattern` to `handler(channel, data)`."""
+        if decode:
+            handler = self._decoding(handler)
+        await self.dispatcher.psubscribe(pattern, handler, queue_size)
+
+    def _decoding(self, handler: Handler) -> Handler:
+        @functools.wraps(handler)
+        async def decoded(channel: str, data: bytes) -> None:
+            await handler(channel, self.serializer.loads(data))
+
+        return decoded
 
     async def publish(self, channel: str, message: any) -> int:
-        if not self.client and not self.reconnect:
-            await self.connect()
+        logger.debug(f"Publishing message to {channel}")
+        receivers = await self.call(self.client.publish, channel, message)
+        self._count_published([message])
+        return receivers
+
+    async def publish_many(self, messages: list[tuple[str, Any]]) -> list[int]:
+        """Publish (channel, message) pairs in a single pipelined round trip."""
+        if not messages:
+            return []
+        self._check_available()
+        pipe = self.client.pipeline(transaction=False)
+        for channel, message in messages:
+            pipe.publish(channel, message)
+        receivers = await self.call(pipe.execute)
+        self._count_published([message for _, message in messages])
+        logger.debug(f"Published {len(messages)} messages in one round trip")
+        return receivers
 
-        logger.info(f"Publishing message to {channel}")
-        await self.client.publish(channel, message)
+    async def publish_object(self, channel: str, obj: Any) -> int:
+        """Publish `obj` as an envelope, see `Serializer`."""
+        return await self.publish(channel, self.serializer.dumps(obj))
+
+    def _count_published(self, messages: list[Any]) -> None:
+        self.counters["published_messages"] += len(messages)
+        self.counters["published_bytes"] += sum(
+            len(m.encode()) if isinstance(m, str) else len(m)
+            for m in messages
+            if isinstance(m, (str, bytes))
+        )
+
+    async def xadd(
+        self,
+        stream: str,
+        fields: dict[str, Any],
+        maxlen: int | None = None,
+        approximate: bool = True,
+    ) -> str:
+        """Append an entry to a stream, trimming it to about `maxlen` entries."""
+        return await self.call(
+            self.client.xadd, stream, fields, maxlen=maxlen, approximate=approximate
+        )
+
+    async def ensure_group(self, stream: str, group: str, start_id: str = "$") -> None:
+        """Create a consumer group (and the stream) unless it already exists."""
+        try:
+            await self.call(
+                self.client.xgroup_create, stream, group, id=start_id, mkstream=True
+            )
+        except redis.ResponseError as e:
+            if "BUSYGROUP" not in str(e):
+                raise
+
+    async def read_group(
+        self,
+        stream: str,
+        group: str,
+        consumer: str,
+        count: int = 100,
+        block_ms: int | None = None,
+        pending: bool = False,
+    ) -> list[tuple[str, dict]]:
+        """
+        Read new entries for `consumer`, or with `pending` its delivered but unacked ones.
+
+        Keep `block_ms` below REDIS_SOCKET_TIMEOUT, a blocked read holds a pooled
+        connection for its whole duration.
+        """
+        response = await self.call(
+            self.client.xreadgroup,
+            group,
+            consumer,
+            {stream: "0" if pending else ">"},
+            count=count,
+            block=None if pending else block_ms,
+        )
+        return self._decode_entries(response[0][1]) if response else []
+
+    async def ack(self, stream: str, group: str, *ids: str) -> int:
+        if not ids:
+            return 0
+        return await self.call(self.client.xack, stream, group, *ids)
+
+    async def delivery_count(self, stream: str, group: str, entry_id: str) -> int:
+        """Times a pending entry has been delivered, 0 once it's acked."""
+        response = await self.call(
+            self.client.xpending_range, stream, group, min=entry_id, max=entry_id, count=1
+        )
+        return response[0]["times_delivered"] if response else 0
+
+    async def claim_stale(
+        self,
+        stream: str,
+        group: str,
+        consumer: str,
+        min_idle_ms: int,
+        count: int = 100,
+    ) -> list[tuple[str, dict]]:
+        """Take over entries other consumers read but left unacked for `min_idle_ms`."""
+        response = await self.call(
+            self.client.xautoclaim,
+            stream,
+            group,
+            consumer,
+            min_idle_time=min_idle_ms,
+            start_id="0-0",
+            count=count,
+        )
+        # Deleted entries come back with empty fields, nothing left to process
+        return self._decode_entries([entry for entry in response[1] if entry[1]])
+
+    @staticmethod
+    def _decode_entries(entries: list) -> list[tuple[str, dict[str, bytes]]]:
+        """Decode entry ids and field names, values stay bytes for the codecs."""
+        return [
+            (entry_id.decode(), {name.decode(): value for name, value in fields.items()})
+            for entry_id, fields in entries
+        ]
+
+    def stats(self) -> dict:
+        pool = self.pool
+        return {
+            "healthy": self.healthy,
+            "pool_size": self.pool_size,
+            "in_use": len(pool._in_use_connections) if pool else 0,
+            "idle": len(pool._available_connections) if pool else 0,
+            **self.counters,
+            "codecs": self.serializer.stats(),
+        }
 
     async def close(self) -> None:
+        await self.dispatcher.close()
+        if self._monitor:
+            self._monitor.cancel()
+            self._monitor = None
         if self.client:
-            self.client.close()
+            await self.client.aclose()
+            await self.pool.disconnect()
+            self.client = None
+            self.pool = None
+            self.healthy = False
             logger.success("Closed connection to redis cache")
         else:
             logger.warning("No connection to close")
+
+
+class BatchPublisher:
+    """
+    Buffers publishes and flushes them through `publish_many`.
+
+    A flush happens every `flush_interval` seconds or as soon as `max_batch`
+    messages are buffered, whichever comes first. At most `max_pending`
+    messages are held while redis is unavailable, the oldest are dropped.
+    """
+
+    def __init__(
+        self,
+        redis_client: RedisClient,
+        flush_interval: float = 0.05,
+        max_batch: int = 100,
+        max_pending: int = 10_000,
+    ):
+        self.redis_client = redis_client
+        self.flush_interval = flush_interval
+        self.max_batch = max_batch
+        self.max_pending = max_pending
+        self.buffer: list[tuple[str, Any]] = []
+        self.dropped = 0
+        self._wake = asyncio.Event()
+        self._task: asyncio.Task | None = None
+
+    def start(self) -> None:
+        if not self._task:
+            self._task = asyncio.create_task(self._run())
+
+    def publish(self, channel: str, message: Any) -> None:
+        self.buffer.append((channel, message))
+        if len(self.buffer) > self.max_pending:
+            overflow = len(self.buffer) - self.max_pending
+            del self.buffer[:overflow]
+            self.dropped += overflow
+        if len(self.buffer) >= self.max_batch:
+            self._wake.set()
+
+    async def _run(self) -> None:
+        while True:
+            deadline = time.monotonic() + self.flush_interval
+            try:
+                await asyncio.wait_for(self._wake.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"Batch publisher flush failed: {e}")
+            # Keep flushing full batches without waiting, otherwise pace to the interval
+            if len(self.buffer) < self.max_batch:
+                await asyncio.sleep(max(0, deadline - time.monotonic()))
+
+    async def flush(self) -> None:
+        while self.buffer:
+            batch = self.buffer[: self.max_batch]
+            try:
+                await self.redis_client.publish_many(batch)
+            except (redis.ConnectionError, redis.TimeoutError) as e:
+                logger.debug(f"Batch publish failed, keeping {len(self.buffer)} buffered: {e}")
+                return
+            except redis.RedisError as e:
+                # Retrying won't help, drop the batch rather than wedge the buffer
+                logger.error(f"Batch publish rejected, dropped {len(batch)} messages: {e}")
+                self.dropped += len(batch)
+            del self.buffer[: len(batch)]
+
+    async def close(self) -> None:
+        if self._task:
+            self._task.cancel()
+            self._task = None
+        try:
+            await self.flush()
+        except Exception as e:
+            logger.warning(f"Dropping {len(self.buffer)} unpublished messages: {e}")
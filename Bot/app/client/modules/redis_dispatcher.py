@@ -0,0 +1,210 @@
+import asyncio
+import time
+
+import redis
+from typing import Any, Awaitable, Callable
+from loguru import logger
+
+Handler = Callable[[str, Any], Awaitable[None]]
+
+
+class _Subscription:
+    __slots__ = (
+        "callback",
+        "queue",
+        "task",
+        "handled",
+        "dropped",
+        "last_lag",
+        "max_lag",
+    )
+
+    def __init__(self, callback: Handler, queue_size: int):
+        self.callback = callback
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self.task: asyncio.Task | None = None
+        self.handled = 0
+        self.dropped = 0
+        self.last_lag = 0.0
+        self.max_lag = 0.0
+
+
+class SubscriptionDispatcher:
+    """
+    One pub/sub connection shared by every subscriber in the process.
+
+    Messages are routed by channel or pattern to registered async handlers,
+    `handler(channel, data)`. Each handler has its own bounded queue and task
+    so a slow handler only delays itself, when its queue is full new messages
+    for it are dropped. The pub/sub connection is rebuilt and every channel
+    and pattern resubscribed whenever redis comes back.
+    """
+
+    def __init__(self, redis_client):
+        self.redis_client = redis_client
+        self.channels: dict[str, list[_Subscription]] = {}
+        self.patterns: dict[str, list[_Subscription]] = {}
+        self.pubsub = None
+        self._reader: asyncio.Task | None = None
+
+    def start(self) -> None:
+        if not self._reader:
+            self._reader = asyncio.create_task(self._read())
+
+    async def subscribe(self, channel: str, handler: Handler, queue_size: int = 1000) -> None:
+        await self._add(self.channels, channel, handler, queue_size)
+
+    async def psubscribe(self, pattern: str, handler: Handler, queue_size: int = 1000) -> None:
+        await self._add(self.patterns, pattern, handler, queue_size)
+
+    async def _add(
+        self,
+        registry: dict[str, list[_Subscription]],
+        key: str,
+        handler: Handler,
+        queue_size: int,
+    ) -> None:
+        subscription = _Subscription(handler, queue_size)
+        subscription.task = asyncio.create_task(self._handle(key, subscription))
+        first = key not in registry
+        registry.setdefault(key, []).append(subscription)
+        logger.info(f"Subscribing {handler.__qualname__} to {key}")
+        # A live connection needs telling, otherwise the reader subscribes on connect
+        if first and self.pubsub is not None:
+            try:
+                if registry is self.patterns:
+                    await self.pubsub.psubscribe(key)
+                else:
+                    await self.pubsub.subscribe(key)
+            except (redis.ConnectionError, redis.TimeoutError) as e:
+                logger.warning(f"Subscribe to {key} deferred until reconnect: {e}")
+
+    async def unsubscribe(self, key: str) -> None:
+        for registry in (self.channels, self.patterns):
+            subscriptions = registry.pop(key, None)
+            if subscriptions is None:
+                continue
+            for subscription in subscriptions:
+                subscription.task.cancel()
+            if self.pubsub is not None:
+                try:
+                    if registry is self.patterns:
+                        await self.pubsub.punsubscribe(key)
+                    else:
+                        await self.pubsub.unsubscribe(key)
+                except (redis.ConnectionError, redis.TimeoutError):
+                    pass
+
+    async def _connect(self):
+        pubsub = self.redis_client.client.pubsub(ignore_subscribe_messages=True)
+        channels: set[str] = set()
+        patterns: set[str] = set()
+        # `_add` and `unsubscribe` can't reach this connection until it's
+        # returned, so catch up with changes made while we were awaiting
+        while True:
+            subscribe = self.channels.keys() - channels
+            psubscribe = self.patterns.keys() - patterns
+            unsubscribe = channels - self.channels.keys()
+            punsubscribe = patterns - self.patterns.keys()
+            if not (subscribe or psubscribe or unsubscribe or punsubscribe):
+                break
+            if subscribe:
+                await pubsub.subscribe(*subscribe)
+            if psubscribe:
+                await pubsub.psubscribe(*psubscribe)
+            if unsubscribe:
+                await pubsub.unsubscribe(*unsubscribe)
+            if punsubscribe:
+                await pubsub.punsubscribe(*punsubscribe)
+            channels = (channels | subscribe) - unsubscribe
+            patterns = (patterns | psubscribe) - punsubscribe
+        logger.info(
+            f"Pub/sub listening on {len(self.channels)} channels and {len(self.patterns)} patterns"
+        )
+        return pubsub
+
+    async def _read(self) -> None:
+        while True:
+            if not self.redis_client.healthy or not (self.channels or self.patterns):
+                await asyncio.sleep(0.5)
+                continue
+            try:
+                self.pubsub = await self._connect()
+                while True:
+                    message = await self.pubsub.get_message(timeout=1.0)
+                    if message is not None:
+                        self._dispatch(message)
+            except asyncio.CancelledError:
+                raise
+            except (redis.ConnectionError, redis.TimeoutError) as e:
+                logger.warning(f"Pub/sub connection lost, resubscribing on reconnect: {e}")
+                self.redis_client._mark_down(e)
+            except Exception as e:
+                logger.error(f"Pub/sub reader failed: {e}")
+                await asyncio.sleep(1)
+            finally:
+                if self.pubsub is not None:
+                    pubsub, self.pubsub = self.pubsub, None
+                    try:
+                        await pubsub.aclose()
+                    except Exception:
+                        pass
+
+    def _dispatch(self, message: dict) -> None:
+        channel = message["channel"].decode()
+        if message["type"] == "pmessage":
+            subscriptions = self.patterns.get(message["pattern"].decode(), ())
+        elif message["type"] == "message":
+            subscriptions = self.channels.get(channel, ())
+        else:
+            return
+        received = time.monotonic()
+        for subscription in subscriptions:
+            try:
+                subscription.queue.put_nowait((received, channel, message["data"]))
+            except asyncio.QueueFull:
+                subscription.dropped += 1
+
+    async def _handle(self, key: str, subscription: _Subscription) -> None:
+        while True:
+            received, channel, data = await subscription.queue.get()
+            lag = time.monotonic() - received
+            subscription.last_lag = lag
+            subscription.max_lag = max(subscription.max_lag, lag)
+            try:
+                await subscription.callback(channel, data)
+                subscription.handled += 1
+            except Exception as e:
+                logger.error(
+                    f"Handler {subscription.callback.__qualname__} failed on {key}: {e}"
+                )
+
+    def stats(self) -> list[dict]:
+        return [
+            {
+                "subscription": key,
+                "handler": subscription.callback.__qualname__,
+                "depth": subscription.queue.qsize(),
+                "handled": subscription.handled,
+                "dropped": subscription.dropped,
+                "last_lag": subscription.last_lag,
+                "max_lag": subscription.max_lag,
+            }
+            for registry in (self.channels, self.patterns)
+            for key, subscriptions in registry.items()
+            for subscription in subscriptions
+        ]
+
+    async def close(self) -> None:
+        tasks = [
+            subscription.task
+            for registry in (self.channels, self.patterns)
+            for subscriptions in registry.values()
+            for subscription in subscriptions
+        ]
+        if self._reader:
+            tasks.append(self._reader)
+            self._reader = None
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
@@ -0,0 +1,243 @@
+import asyncio
+import os
+import socket
+import time
+import uuid
+
+import redis
+from typing import Awaitable, Callable
+from loguru import logger
+
+from .settings import env_float
+
+Job = Callable[[], Awaitable[None]]
+
+# Lock values are "owner:fence". Acquiring (or re-acquiring our own lock)
+# returns the fence, a number that only ever grows across holders.
+ACQUIRE = """
+local value = redis.call('GET', KEYS[1])
+if value then
+    local owner, fence = string.match(value, '^(.*):(%d+)$')
+    if owner == ARGV[1] then
+        redis.call('PEXPIRE', KEYS[1], ARGV[2])
+        return tonumber(fence)
+    end
+    return false
+end
+local fence = redis.call('INCR', KEYS[2])
+redis.call('SET', KEYS[1], ARGV[1] .. ':' .. fence, 'PX', ARGV[2])
+return fence
+"""
+
+RENEW = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('PEXPIRE', KEYS[1], ARGV[2])
+end
+return 0
+"""
+
+RELEASE = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+
+class LeaseLock:
+    """
+    A lock held for `ttl` seconds unless renewed.
+
+    Every acquisition by a new holder hands out a fencing token larger than
+    any before it. Work that outlives a lost lease can compare its token
+    against `current_fence` and back off instead of clobbering the new
+    holder's writes.
+    """
+
+    def __init__(self, redis_client, name: str, ttl: float = 15, owner: str | None = None):
+        self.redis_client = redis_client
+        self.key = f"lock:{name}"
+        self.fence_key = f"lock:{name}:fence"
+        self.ttl = ttl
+        self.owner = owner or f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self.fence: int | None = None
+        self._scripts = None
+
+    def _script(self, name: str):
+        if self._scripts is None:
+            client = self.redis_client.client
+            self._scripts = {
+                "acquire": client.register_script(ACQUIRE),
+                "renew": client.register_script(RENEW),
+                "release": client.register_script(RELEASE),
+            }
+        return self._scripts[name]
+
+    @property
+    def _value(self) -> str:
+        return f"{self.owner}:{self.fence}"
+
+    async def acquire(self) -> int | None:
+        """Take or extend the lease, returns the fencing token or None if held elsewhere."""
+        fence = await self.redis_client.call(
+            self._script("acquire"),
+            keys=[self.key, self.fence_key],
+            args=[self.owner, int(self.ttl * 1000)],
+        )
+        self.fence = int(fence) if fence else None
+        return self.fence
+
+    async def renew(self) -> bool:
+        if self.fence is None:
+            return False
+        renewed = await self.redis_client.call(
+            self._script("renew"), keys=[self.key], args=[self._value, int(self.ttl * 1000)]
+        )
+        if not renewed:
+            self.fence = None
+        return bool(renewed)
+
+    async def release(self) -> bool:
+        if self.fence is None:
+            return False
+        released = await self.redis_client.call(
+            self._script("release"), keys=[self.key], args=[self._value]
+        )
+        self.fence = None
+        return bool(released)
+
+    async def current_fence(self) -> int | None:
+        """The fencing token of whoever holds the lock right now."""
+        value = await self.redis_client.call(self.redis_client.client.get, self.key)
+        if not value:
+            return None
+        return int(value.rsplit(b":", 1)[1])
+
+
+class LeaderElection:
+    """
+    Elects one process to run background jobs among every replica of the bot.
+
+    Replicas race for a `LeaseLock`. The leader renews it every `ttl / 3`
+    seconds and runs the jobs given to `run`, cancelling them the moment it
+    loses the lease or can't renew it before it runs out. Standbys retry
+    every `retry_interval` seconds and immediately when the leader releases
+    the lock on shutdown. Without redis nobody leads, jobs pause rather than
+    risk running twice.
+    """
+
+    def __init__(
+        self,
+        redis_client,
+        name: str,
+        ttl: float = env_float("BOT_LEADER_TTL", 15),
+        retry_interval: float = env_float("BOT_LEADER_RETRY", 2),
+    ):
+        self.redis_client = redis_client
+        self.lock = LeaseLock(redis_client, name, ttl)
+        self.channel = f"lock:{name}:released"
+        self.ttl = ttl
+        self.renew_interval = ttl / 3
+        self.retry_interval = retry_interval
+        self.jobs: list[Job] = []
+        self.running: list[asyncio.Task] = []
+        self.expires = 0.0
+        self.leading = False
+        self.elections = 0
+        self._wake = asyncio.Event()
+        self._task: asyncio.Task | None = None
+
+    @property
+    def is_leader(self) -> bool:
+        # Step down locally a renew interval before redis would expire the lease
+        return self.lock.fence is not None and time.monotonic() < self.expires
+
+    @property
+    def fence(self) -> int | None:
+        return self.lock.fence if self.is_leader else None
+
+    def run(self, job: Job) -> None:
+        """Run `job()` whenever this process becomes leader, cancelled when it stops being one."""
+        self.jobs.append(job)
+        if self.leading:
+            self.running.append(asyncio.create_task(job()))
+
+    async def start(self) -> None:
+        await self.redis_client.subscribe(self.channel, self._on_released)
+        if not self._task:
+            self._task = asyncio.create_task(self._campaign())
+
+    async def _on_released(self, channel: str, data: bytes) -> None:
+        self._wake.set()
+
+    async def _campaign(self) -> None:
+        while True:
+            started = time.monotonic()
+            try:
+                if self.is_leader:
+                    held = await self.lock.renew()
+                else:
+                    held = await self.lock.acquire() is not None
+            except asyncio.CancelledError:
+                raise
+            except redis.ConnectionError:
+                held = self.is_leader
+            except Exception as e:
+                logger.error(f"Leader election for {self.lock.key} failed: {e}")
+                held = self.is_leader
+            else:
+                if held:
+                    self.expires = started + self.ttl - self.renew_interval
+
+            if held and self.is_leader and not self.leading:
+                self._elected()
+            elif not self.is_leader and self.leading:
+                await self._demoted()
+
+            if self.is_leader:
+                await asyncio.sleep(self.renew_interval)
+            else:
+                self._wake.clear()
+                try:
+                    await asyncio.wait_for(self._wake.wait(), self.retry_interval)
+                except asyncio.TimeoutError:
+                    pass
+
+    def _elected(self) -> None:
+        self.elections += 1
+        self.leading = True
+        logger.success(f"Elected leader for {self.lock.key} with fence {self.lock.fence}")
+        self.running = [asyncio.create_task(job()) for job in self.jobs]
+
+    async def _demoted(self) -> None:
+        logger.warning(f"Stepping down as leader for {self.lock.key}, stopping background jobs")
+        self.leading = False
+        running, self.running = self.running, []
+        for task in running:
+            task.cancel()
+        await asyncio.gather(*running, return_exceptions=True)
+
+    def stats(self) -> dict:
+        return {
+            "lock": self.lock.key,
+            "owner": self.lock.owner,
+            "leader": self.is_leader,
+            "fence": self.fence,
+            "elections": self.elections,
+            "jobs": len(self.running),
+        }
+
+    async def close(self) -> None:
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        if self.leading:
+            await self._demoted()
+        # Hand over straight away instead of making standbys wait out the lease
+        try:
+            if await self.lock.release():
+                await self.redis_client.publish(self.channel, self.lock.owner)
+        except redis.ConnectionError:
+            pass
+        await self.redis_client.dispatcher.unsubscribe(self.channel)
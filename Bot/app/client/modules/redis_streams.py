@@ -0,0 +1,190 @@
+import asyncio
+import os
+import socket
+import time
+
+import redis
+from typing import Awaitable, Callable
+from cachetools import TTLCache
+from loguru import logger
+
+BatchHandler = Callable[[list[tuple[str, dict]]], Awaitable[None]]
+
+
+class StreamConsumer:
+    """
+    Consumes a redis stream as one member of a consumer group.
+
+    Entries are handed to `handler` in batches of up to `batch_size` and only
+    acked once it returns. When a batch raises its entries are retried one by
+    one, those that fail stay pending and are delivered again. An entry that
+    has failed `max_deliveries` times is moved to the `dead_letter` stream
+    (`{stream}:dead` by default) with its id and error, and acked, so it
+    can't hold up the stream. On start, and after every failure, the consumer
+    first re-reads its own pending entries. Every `claim_interval` seconds it also
+    claims entries dead consumers left pending for over `claim_idle_ms`.
+
+    With `min_interval` set, reads are spaced at least that many seconds apart
+    so everything arriving in between is handled as a single batch.
+    """
+
+    def __init__(
+        self,
+        redis_client,
+        stream: str,
+        group: str,
+        handler: BatchHandler,
+        consumer: str | None = None,
+        batch_size: int = 100,
+        block_ms: int = 2000,
+        min_interval: float = 0,
+        claim_idle_ms: int = 60_000,
+        claim_interval: float = 30,
+        max_deliveries: int = 5,
+        dead_letter: str | None = None,
+        dead_letter_maxlen: int = 10_000,
+    ):
+        self.redis_client = redis_client
+        self.stream = stream
+        self.group = group
+        self.handler = handler
+        self.consumer = consumer or f"{socket.gethostname()}-{os.getpid()}"
+        self.batch_size = batch_size
+        self.block_ms = block_ms
+        self.min_interval = min_interval
+        self.claim_idle_ms = claim_idle_ms
+        self.claim_interval = claim_interval
+        self.max_deliveries = max_deliveries
+        self.dead_letter = dead_letter or f"{stream}:dead"
+        self.dead_letter_maxlen = dead_letter_maxlen
+        # Failures seen here, pending re-reads don't always bump the server count
+        self.failures: TTLCache = TTLCache(maxsize=10_000, ttl=3600)
+        self.handled = 0
+        self.claimed = 0
+        self.dead_lettered = 0
+        self._task: asyncio.Task | None = None
+
+    def start(self) -> None:
+        if not self._task:
+            self._task = asyncio.create_task(self._run())
+
+    async def _process(self, entries: list[tuple[str, dict]]) -> None:
+        try:
+            await self.handler(entries)
+        except Exception as e:
+            if len(entries) > 1:
+                await self._process_each(entries, e)
+            elif not await self._dead_letter_if_exhausted(entries[0], e):
+                raise
+            return
+        await self.redis_client.ack(
+            self.stream, self.group, *[entry_id for entry_id, _ in entries]
+        )
+        self.handled += len(entries)
+        for entry_id, _ in entries:
+            self.failures.pop(entry_id, None)
+
+    async def _process_each(self, entries: list[tuple[str, dict]], error: Exception) -> None:
+        logger.warning(f"Batch from {self.stream} failed, retrying entries one by one: {error}")
+        failed = None
+        for entry in entries:
+            try:
+                await self._process([entry])
+            except Exception as e:
+                failed = e
+        if failed is not None:
+            raise failed
+
+    async def _dead_letter_if_exhausted(
+        self, entry: tuple[str, dict], error: Exception
+    ) -> bool:
+        entry_id, fields = entry
+        attempts = max(
+            self.failures.get(entry_id, 0) + 1,
+            await self.redis_client.delivery_count(self.stream, self.group, entry_id),
+        )
+        if attempts < self.max_deliveries:
+            self.failures[entry_id] = attempts
+            return False
+        logger.error(
+            f"Dead-lettering {entry_id} from {self.stream} after {attempts} attempts: {error}"
+        )
+        await self.redis_client.xadd(
+            self.dead_letter,
+            {**fields, "origin_id": entry_id, "error": str(error)[:500]},
+            maxlen=self.dead_letter_maxlen,
+        )
+        await self.redis_client.ack(self.stream, self.group, entry_id)
+        self.failures.pop(entry_id, None)
+        self.dead_lettered += 1
+        return True
+
+    async def _run(self) -> None:
+        pending = True
+        last_claim = 0.0
+        while True:
+            started = time.monotonic()
+            try:
+                if pending:
+                    await self.redis_client.ensure_group(self.stream, self.group)
+
+                if started - last_claim >= self.claim_interval:
+                    last_claim = started
+                    claimed = await self.redis_client.claim_stale(
+                        self.stream,
+                        self.group,
+                        self.consumer,
+                        self.claim_idle_ms,
+                        self.batch_size,
+                    )
+                    if claimed:
+                        logger.info(f"Claimed {len(claimed)} stale entries from {self.stream}")
+                        self.claimed += len(claimed)
+                        await self._process(claimed)
+
+                entries = await self.redis_client.read_group(
+                    self.stream,
+                    self.group,
+                    self.consumer,
+                    count=self.batch_size,
+                    block_ms=self.block_ms,
+                    pending=pending,
+                )
+                if pending and not entries:
+                    pending = False
+                    continue
+                if entries:
+                    await self._process(entries)
+            except asyncio.CancelledError:
+                raise
+            except redis.ConnectionError:
+                # Circuit is open, the client reconnects in the background
+                pending = True
+                await asyncio.sleep(1)
+                continue
+            except Exception as e:
+                logger.error(f"Consumer for {self.stream} failed, retrying pending: {e}")
+                pending = True
+                await asyncio.sleep(1)
+                continue
+
+            if self.min_interval:
+                await asyncio.sleep(
+                    max(0, self.min_interval - (time.monotonic() - started))
+                )
+
+    def stats(self) -> dict:
+        return {
+            "stream": self.stream,
+            "group": self.group,
+            "consumer": self.consumer,
+            "handled": self.handled,
+            "claimed": self.claimed,
+            "dead_lettered": self.dead_lettered,
+        }
+
+    async def close(self) -> None:
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
@@ -0,0 +1,21 @@
+import os
+
+
+def env(name: str, default: str | None = None) -> str | None:
+    """`os.getenv` treating an empty value, as a blank `.env` line gives, as unset."""
+    return os.getenv(name) or default
+
+
+def env_int(name: str, default: int) -> int:
+    value = env(name)
+    return int(value) if value else default
+
+
+def env_float(name: str, default: float) -> float:
+    value = env(name)
+    return float(value) if value else default
+
+
+def env_bool(name: str, default: bool) -> bool:
+    value = env(name)
+    return value.lower() == "true" if value else default
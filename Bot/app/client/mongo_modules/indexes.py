@@ -0,0 +1,92 @@
+from dataclasses import dataclass, field
+from typing import Any
+
+from loguru import logger
+from pymongo import IndexModel
+from pymongo.errors import ConnectionFailure
+
+from ..modules.mongo import MongoClient
+
+
+class QueryPlanError(RuntimeError):
+    """Raised when a registered hot query would scan its whole collection."""
+
+
+@dataclass(frozen=True)
+class Index:
+    collection: str
+    keys: list[tuple[str, int]]
+    name: str
+    unique: bool = False
+
+
+@dataclass(frozen=True)
+class HotQuery:
+    """A query shape run often enough that it must always be served by an index."""
+
+    name: str
+    collection: str
+    filter: dict[str, Any]
+    sort: list[tuple[str, int]] = field(default_factory=list)
+
+
+# `_id` is indexed by mongo itself, only secondary indexes are declared here
+INDEXES = [
+    Index("System", [("tag", 1), ("url", 1)], name="tag_url"),
+]
+
+HOT_QUERIES = [
+    HotQuery("whitelist", "System", {"tag": "whitelisted_url"}),
+    HotQuery("user", "Users", {"_id": 0}),
+    HotQuery("join_role", "Join-roles", {"_id": 0}),
+    HotQuery("active_rankup", "Active Rankups", {"_id": 0}),
+]
+
+
+async def ensure_indexes(mongo: MongoClient) -> None:
+    """Create every registered index, a no-op for the ones that already exist."""
+    by_collection: dict[str, list[IndexModel]] = {}
+    for index in INDEXES:
+        by_collection.setdefault(index.collection, []).append(
+            IndexModel(index.keys, name=index.name, unique=index.unique)
+        )
+    for collection, models in by_collection.items():
+        names = await mongo.get_collection(collection).create_indexes(models)
+        logger.debug(f"Ensured indexes {names} on {collection}")
+
+
+def _stages(plan: Any):
+    if isinstance(plan, dict):
+        if "stage" in plan:
+            yield plan["stage"]
+        for value in plan.values():
+            yield from _stages(value)
+    elif isinstance(plan, list):
+        for value in plan:
+            yield from _stages(value)
+
+
+async def verify_query_plans(mongo: MongoClient) -> None:
+    """Explain every hot query and raise `QueryPlanError` for any that collection scans."""
+    scans = []
+    for query in HOT_QUERIES:
+        cursor = mongo.get_collection(query.collection).find(query.filter)
+        if query.sort:
+            cursor = cursor.sort(query.sort)
+        plan = (await cursor.explain())["queryPlanner"]["winningPlan"]
+        stages = set(_stages(plan))
+        if "COLLSCAN" in stages:
+            scans.append(f"{query.name} ({query.collection} {query.filter})")
+        else:
+            logger.debug(f"Hot query {query.name} planned as {sorted(stages)}")
+    if scans:
+        raise QueryPlanError(f"Hot queries without an index: {', '.join(scans)}")
+
+
+async def setup_indexes(mongo: MongoClient) -> None:
+    """Ensure indexes then verify hot query plans, skipped while mongo is unreachable."""
+    try:
+        await ensure_indexes(mongo)
+        await verify_query_plans(mongo)
+    except ConnectionFailure as e:
+        logger.error(f"Skipped index checks, MongoDB unreachable: {e}")
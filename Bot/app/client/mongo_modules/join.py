@@ -1,18 +1,26 @@
 import discord
 from loguru import logger
-from ..modules.mongo import MongoClient
+from ..modules.cache import cache
+from ..modules.mongo import get_mongo
+from . import replica
 
 
-client = MongoClient()
+@cache.cached("join_roles", ttl=3600)
+async def load_roles() -> list[dict]:
+    roles = await get_mongo().get_many(
+        collection="Join-roles", query={}, projection={"name": 1}
+    )
+    return [{"id": doc["_id"], "name": doc["name"]} for doc in roles]
 
 
 async def get_roles() -> None | list:
+    if replica.join_roles.ready:
+        return [
+            {"id": doc["_id"], "name": doc["name"]}
+            for doc in replica.join_roles.docs.values()
+        ]
     try:
-        roles = await client.get_many(collection="Join-roles", query={})
-        join_roles: list[discord.Object] = []
-        for doc in roles:
-            join_roles.append({"id": doc["_id"], "name": doc["name"]})
-        return join_roles
+        return await load_roles()
     except Exception as e:
         logger.error(f"Error getting roles: {e}")
 
@@ -21,7 +29,10 @@ async def add_role(role: discord.Role) -> None | bool:
     new_role = {"_id": role.id, "name": role.name}
     logger.info(role.name)
     try:
-        await client.insert_document(collection="Join-roles", document=new_role)
+        await get_mongo().insert_document(
+            collection="Join-roles", document=new_role
+        )
+        await load_roles.invalidate()
         return True
     except Exception as e:
         logger.error(f"Error adding role: {e}")
@@ -29,7 +40,10 @@ async def add_role(role: discord.Role) -> None | bool:
 
 async def delete_role(role: discord.Role) -> None | bool:
     try:
-        await client.delete_document(collection="Join-roles", query={"_id": role.id})
+        await get_mongo().delete_document(
+            collection="Join-roles", query={"_id": role.id}
+        )
+        await load_roles.invalidate()
         return True
     except Exception as e:
         logger.error(f"Error deleting role: {e}")
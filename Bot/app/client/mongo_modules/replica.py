@@ -0,0 +1,224 @@
+import asyncio
+import time
+from typing import Any, Callable, Iterator
+
+import bson
+from dotenv import load_dotenv
+from loguru import logger
+from pymongo.errors import ConnectionFailure, OperationFailure
+
+from ..modules.mongo import MongoClient
+from ..modules.settings import env_bool, env_float, env_int
+
+load_dotenv()
+
+# Server codes meaning the resume token can't be used any more
+RESUME_FAILED = {136, 260, 280, 286}
+# Change streams need a replica set or sharded cluster
+UNSUPPORTED = {40573}
+
+
+class ReplicaFullError(RuntimeError):
+    """Raised when a replicated collection outgrows its memory budget."""
+
+
+class CollectionReplica:
+    """
+    In-memory copy of a small collection, kept current by a change stream.
+
+    The stream is opened before the full load so no write between the two
+    is missed, then every change is applied as it arrives. After a dropped
+    connection the stream resumes from its last token, and when the token
+    has fallen off the oplog the whole collection is loaded again.
+
+    `staleness` is how long ago the stream last confirmed it was caught up,
+    and reads should only trust the replica while `ready`. The replica gives
+    up and clears itself if the documents outgrow `max_bytes`.
+    """
+
+    def __init__(
+        self,
+        collection: str,
+        projection: dict[str, int] | None = None,
+        max_bytes: int = env_int("MONGO_REPLICA_MAX_BYTES", 16777216),
+        max_staleness: float = env_float("MONGO_REPLICA_MAX_STALENESS", 30),
+    ):
+        self.collection = collection
+        self.projection = projection
+        self.max_bytes = max_bytes
+        self.max_staleness = max_staleness
+        self.docs: dict[Any, dict] = {}
+        self.sizes: dict[Any, int] = {}
+        self.bytes = 0
+        self.resume_token: dict | None = None
+        self.loaded = False
+        self.synced_at = 0.0
+        self.counters = {"reloads": 0, "changes": 0, "resumes": 0}
+        self._task: asyncio.Task | None = None
+
+    @property
+    def staleness(self) -> float:
+        return time.monotonic() - self.synced_at if self.loaded else float("inf")
+
+    @property
+    def ready(self) -> bool:
+        return self.loaded and self.staleness < self.max_staleness
+
+    def get(self, _id: Any) -> dict | None:
+        return self.docs.get(_id)
+
+    def find(self, predicate: Callable[[dict], bool]) -> Iterator[dict]:
+        return (doc for doc in self.docs.values() if predicate(doc))
+
+    def start(self, mongo: MongoClient) -> None:
+        if not self._task:
+            self._task = asyncio.create_task(self._run(mongo))
+
+    def _pipeline(self) -> list[dict]:
+        if not self.projection:
+            return []
+        # Event metadata must survive, its _id is the resume token
+        fields = {
+            f"fullDocument.{name}": value for name, value in self.projection.items()
+        }
+        return [{"$project": {"operationType": 1, "documentKey": 1, **fields}}]
+
+    async def _run(self, mongo: MongoClient) -> None:
+        retries = 0
+        while True:
+            try:
+                await self._follow(mongo)
+                # The stream was invalidated, reload straight away
+                retries = 0
+                continue
+            except asyncio.CancelledError:
+                raise
+            except OperationFailure as e:
+                if e.code in UNSUPPORTED:
+                    logger.warning(
+                        f"Change streams unsupported, not replicating {self.collection}"
+                    )
+                    self._clear()
+                    return
+                if e.code in RESUME_FAILED:
+                    logger.warning(
+                        f"Lost {self.collection} resume token, reloading: {e}"
+                    )
+                    self.resume_token = None
+                else:
+                    logger.error(f"{self.collection} replica failed: {e}")
+            except ConnectionFailure as e:
+                logger.warning(f"{self.collection} change stream disconnected: {e}")
+            except ReplicaFullError as e:
+                logger.error(f"{self.collection} replica disabled: {e}")
+                self._clear()
+                return
+            retries = min(retries + 1, 5)
+            await asyncio.sleep(2**retries)
+
+    async def _follow(self, mongo: MongoClient) -> None:
+        collection = mongo.get_collection(self.collection)
+        async with await collection.watch(
+            self._pipeline(),
+            full_document="updateLookup",
+            resume_after=self.resume_token,
+            max_await_time_ms=int(self.max_staleness * 1000 / 3),
+        ) as stream:
+            if self.resume_token is None:
+                await self._reload(mongo)
+            else:
+                self.counters["resumes"] += 1
+            while stream.alive:
+                change = await stream.try_next()
+                if change is not None and not self._apply(change):
+                    self.resume_token = None
+                    return
+                self.resume_token = stream.resume_token
+                # Every empty getMore also proves we're caught up
+                self.synced_at = time.monotonic()
+
+    async def _reload(self, mongo: MongoClient) -> None:
+        self._clear()
+        async for doc in mongo.find(
+            self.collection, {}, self.projection, batch_size=1000
+        ):
+            self._store(doc)
+        self.loaded = True
+        self.synced_at = time.monotonic()
+        self.counters["reloads"] += 1
+        logger.info(
+            f"Replicated {len(self.docs)} {self.collection} documents in {self.bytes} bytes"
+        )
+
+    def _apply(self, change: dict) -> bool:
+        """Apply one change event, False once the stream can't be followed further."""
+        if change["operationType"] in ("drop", "rename", "dropDatabase", "invalidate"):
+            return False
+        self.counters["changes"] += 1
+        _id = change["documentKey"]["_id"]
+        operation = change["operationType"]
+        if operation in ("insert", "update", "replace"):
+            document = change.get("fullDocument")
+            if document is None:
+                # Deleted again before the update was looked up
+                self._remove(_id)
+            else:
+                self._store({**document, "_id": _id})
+        elif operation == "delete":
+            self._remove(_id)
+        return True
+
+    def _store(self, doc: dict) -> None:
+        self._remove(doc["_id"])
+        size = len(bson.encode(doc))
+        self.docs[doc["_id"]] = doc
+        self.sizes[doc["_id"]] = size
+        self.bytes += size
+        if self.bytes > self.max_bytes:
+            raise ReplicaFullError(f"{self.collection} outgrew {self.max_bytes} bytes")
+
+    def _remove(self, _id: Any) -> None:
+        self.docs.pop(_id, None)
+        self.bytes -= self.sizes.pop(_id, 0)
+
+    def _clear(self) -> None:
+        self.docs.clear()
+        self.sizes.clear()
+        self.bytes = 0
+        self.loaded = False
+
+    def stats(self) -> dict:
+        return {
+            "collection": self.collection,
+            "documents": len(self.docs),
+            "bytes": self.bytes,
+            "staleness": self.staleness,
+            "ready": self.ready,
+            **self.counters,
+        }
+
+    async def close(self) -> None:
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+
+users = CollectionReplica("Users", projection={"individual_permissions": 1})
+system = CollectionReplica("System")
+join_roles = CollectionReplica("Join-roles", projection={"name": 1})
+
+REPLICAS = [users, system, join_roles]
+
+
+def start_replicas(mongo: MongoClient) -> None:
+    """Start replicating, only when MONGO_REPLICA_CACHE is enabled."""
+    if not env_bool("MONGO_REPLICA_CACHE", False):
+        return
+    for replica in REPLICAS:
+        replica.start(mongo)
+
+
+async def close_replicas() -> None:
+    for replica in REPLICAS:
+        await replica.close()
@@ -0,0 +1,149 @@
+import asyncio
+from typing import Any
+
+from pymongo import ReturnDocument
+from pymongo.asynchronous.client_session import AsyncClientSession
+from pymongo.collection import Collection
+from pymongo.results import InsertOneResult, UpdateResult
+
+from ..modules.mongo import BulkResult, MongoClient, get_mongo
+from .user_model import UserModel
+
+
+class Repository:
+    """Data access for one collection over the shared client, never opens its own."""
+
+    collection: str = ""
+
+    @property
+    def mongo(self) -> MongoClient:
+        return get_mongo()
+
+    @property
+    def docs(self) -> Collection:
+        return self.mongo.get_collection(self.collection)
+
+
+class UserRepository(Repository):
+    collection = "Users"
+
+    async def get(
+        self, user_id: int, session: AsyncClientSession | None = None
+    ) -> dict | None:
+        return await self.docs.find_one({"_id": user_id}, session=session)
+
+    async def load(self, user_id: int, *fields: str) -> UserModel | None:
+        """Load a user as a model, only with `fields` when any are given."""
+        document = await self.docs.find_one(
+            {"_id": user_id}, projection=UserModel.projection(*fields)
+        )
+        return None if document is None else UserModel.from_document(document)
+
+    async def save(
+        self, user: UserModel, session: AsyncClientSession | None = None
+    ) -> UpdateResult | None:
+        """Write only the fields changed since the user was loaded."""
+        changes = user.changes()
+        if not changes:
+            return None
+        result = await self.docs.update_one({"_id": user._id}, changes, session=session)
+        user.clean()
+        return result
+
+    async def insert(self, user: dict[str, Any]) -> InsertOneResult:
+        return await self.docs.insert_one(user)
+
+    async def update(
+        self,
+        user_id: int,
+        fields: dict[str, Any],
+        session: AsyncClientSession | None = None,
+    ) -> UpdateResult:
+        return await self.docs.update_one(
+            {"_id": user_id}, {"$set": fields}, session=session
+        )
+
+    async def upsert(
+        self, user_id: int, fields: dict[str, Any], defaults: dict[str, Any]
+    ) -> UpdateResult:
+        """Set `fields`, creating the user from `defaults` first if needed, in one round trip."""
+        on_insert = {
+            k: v for k, v in defaults.items() if k != "_id" and k not in fields
+        }
+        return await self.docs.update_one(
+            {"_id": user_id},
+            {"$set": fields, "$setOnInsert": on_insert},
+            upsert=True,
+        )
+
+    async def upsert_many(
+        self, users: list[dict[str, Any]], ordered: bool = False
+    ) -> BulkResult:
+        return await self.mongo.upsert_many(self.collection, users, ordered=ordered)
+
+
+class RankRepository(Repository):
+    collection = "Ranking System"
+
+    async def all(self) -> list[dict]:
+        return await self.docs.find({}).to_list()
+
+
+class RankupRepository(Repository):
+    collection = "Active Rankups"
+
+    def __init__(self, users: UserRepository, ranks: RankRepository):
+        self.users = users
+        self.ranks = ranks
+
+    async def get(self, user_id: int) -> dict | None:
+        return await self.docs.find_one({"_id": user_id})
+
+    async def start(self, user_id: int) -> dict | None:
+        """Open a rankup listing every account of the user and the ranks on offer."""
+        user, ranks = await asyncio.gather(
+            self.users.load(user_id, "rsn", "alts"), self.ranks.all()
+        )
+        if user is None:
+            return None
+        accounts = [user.rsn] + [alt.get("rsn") for alt in user.alts or []]
+        rankup = {
+            "_id": user_id,
+            "accounts": [account for account in accounts if account],
+            "ranks": ranks,
+            "selected_rank": None,
+        }
+        await self.docs.insert_one(rankup)
+        return rankup
+
+    async def select(self, user_id: int, rank: str) -> dict | None:
+        return await self.docs.find_one_and_update(
+            {"_id": user_id},
+            {"$set": {"selected_rank": rank}},
+            return_document=ReturnDocument.AFTER,
+        )
+
+    async def close(self, user_id: int) -> str | None:
+        """
+        Apply the selected rank to the user and remove the rankup, atomically.
+
+        Returns the applied rank, or None when there was no open rankup.
+        """
+
+        async def close(session: AsyncClientSession) -> str | None:
+            rankup = await self.docs.find_one_and_delete(
+                {"_id": user_id}, projection={"selected_rank": 1}, session=session
+            )
+            if rankup is None:
+                return None
+            await self.users.update(
+                user_id, {"rank": rankup["selected_rank"]}, session=session
+            )
+            return rankup["selected_rank"]
+
+        return await self.mongo.run_transaction(close)
+
+
+users = UserRepository()
+ranks = RankRepository()
+rankups = RankupRepository(users, ranks)
@@ -1,22 +1,132 @@
-from typing import TypedDict
-
-
-class UserModel(TypedDict):
-    _id: int
-    rsn: str = None
-    rank: int = None
-    donations: int = 0
-    event_winnings: int = 0
-    loot_value: int = 0
-    last_seen: int = 0
-    alts: list[dict[str, str]] = []
-    pk_kills: int = 0
-    pk_deaths: int = 0
-    pk_kd: int = 0
-    pk_gained: int = 0
-    pk_lost: int = 0
-    known_names: list[str] = []
-    hof_ref: str = None
-    individual_permissions: dict[str, bool] = {}
-    tags: list[dict[str, bool]] = []
-    incidents: dict[dict[str, str]] = {}
+from typing import Any, Callable, ClassVar
+
+import bson
+
+
+class Model:
+    """
+    Slotted document model with partial loading and dirty-field tracking.
+
+    Subclasses list their fields with a default factory each in `fields` and
+    repeat the names in `__slots__`. Fields missing from a loaded document,
+    left out by a projection or by an older document, read as their default
+    like `.get` did on the raw dict. Only the fields actually loaded or set
+    make it into `to_document`. Assigning a field marks it dirty, `changes`
+    returns just those fields as a `$set`, so defaults are never written back
+    unless assigned. Mutating a list or dict in place isn't seen, `touch` the
+    field afterwards.
+    """
+
+    __slots__ = ("_loaded", "_dirty")
+    fields: ClassVar[dict[str, Callable[[], Any]]] = {}
+
+    def __init__(self, **values: Any):
+        unknown = values.keys() - self.fields.keys()
+        if unknown:
+            raise TypeError(f"Unknown {type(self).__name__} fields: {sorted(unknown)}")
+        for name, default in self.fields.items():
+            object.__setattr__(
+                self, name, values[name] if name in values else default()
+            )
+        object.__setattr__(self, "_loaded", set(self.fields))
+        object.__setattr__(self, "_dirty", set())
+
+    @classmethod
+    def from_document(cls, document: dict[str, Any]):
+        """Wrap a loaded document, fields it doesn't have get their defaults."""
+        model = cls.__new__(cls)
+        loaded = set()
+        for name, default in cls.fields.items():
+            if name in document:
+                object.__setattr__(model, name, document[name])
+                loaded.add(name)
+            else:
+                object.__setattr__(model, name, default())
+        object.__setattr__(model, "_loaded", loaded)
+        object.__setattr__(model, "_dirty", set())
+        return model
+
+    @classmethod
+    def decode(cls, data: bytes):
+        return cls.from_document(bson.decode(data))
+
+    @classmethod
+    def projection(cls, *fields: str) -> dict[str, int] | None:
+        """Projection loading only `fields`, or everything when none are given."""
+        if not fields:
+            return None
+        unknown = set(fields) - cls.fields.keys()
+        if unknown:
+            raise TypeError(f"Unknown {cls.__name__} fields: {sorted(unknown)}")
+        return {name: 1 for name in fields}
+
+    @classmethod
+    def defaults(cls) -> dict[str, Any]:
+        return {name: default() for name, default in cls.fields.items()}
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        object.__setattr__(self, name, value)
+        if name in self.fields:
+            self._loaded.add(name)
+            self._dirty.add(name)
+
+    def touch(self, *names: str) -> None:
+        """Mark fields changed in place as dirty."""
+        self._loaded.update(names)
+        self._dirty.update(names)
+
+    @property
+    def dirty(self) -> bool:
+        return bool(self._dirty)
+
+    def changes(self) -> dict[str, Any]:
+        """`$set` update of the dirty fields, empty when nothing changed."""
+        if not self._dirty:
+            return {}
+        return {"$set": {name: getattr(self, name) for name in self._dirty}}
+
+    def clean(self) -> None:
+        self._dirty.clear()
+
+    def to_document(self) -> dict[str, Any]:
+        return {
+            name: getattr(self, name) for name in self.fields if name in self._loaded
+        }
+
+    def encode(self) -> bytes:
+        return bson.encode(self.to_document())
+
+    def __eq__(self, other: object) -> bool:
+        if type(other) is not type(self):
+            return NotImplemented
+        return self.to_document() == other.to_document()
+
+    def __repr__(self) -> str:
+        fields = ", ".join(f"{k}={v!r}" for k, v in self.to_document().items())
+        return f"{type(self).__name__}({fields})"
+
+
+class UserModel(Model):
+    fields = {
+        "_id": lambda: None,
+        "rsn": lambda: None,
+        "rank": lambda: None,
+        "donations": lambda: 0,
+        "event_winnings": lambda: 0,
+        "loot_value": lambda: 0,
+        "last_seen": lambda: 0,
+        "activity_flag": lambda: None,
+        "alts": list,
+        "pk_kills": lambda: 0,
+        "pk_deaths": lambda: 0,
+        "pk_kd": lambda: 0,
+        "pk_gained": lambda: 0,
+        "pk_lost": lambda: 0,
+        "known_names": list,
+        "hof_ref": lambda: None,
+        # Stored as None until the first permission is granted
+        "individual_permissions": lambda: None,
+        "tags": list,
+        "incidents": dict,
+    }
+    __slots__ = tuple(fields)
@@ -1,17 +1,59 @@
-from fastapi import FastAPI, WebSocket, WebSocketDisconnect, Header, HTTPException
-from typing import List, Dict, Any, Optional
-from pydantic import BaseModel
-from cachetools import TTLCache
-import asyncio
+from fastapi import FastAPI, WebSocket, WebSocketDisconnect, Depends, HTTPException, Request
+from typing import List, Dict, Any, Optional, Tuple
+from contextlib import asynccontextmanager
+from pydantic import BaseModel, TypeAdapter, ValidationError
 from loguru import logger
+import math
+import time
 
-app = FastAPI(debug=True)
+from modules import redis_conn
+from modules.auth import Authenticator
+from modules.broadcast import Broadcaster
+from modules.dedupe import DedupeStore, RedisDedupeTier
+from modules.forwarder import ForwardingPipeline
+from modules.history import History
+from modules.hub import RedisHub
+from modules.ingest import CursorStore, DecodeError, decode_batch
+from modules.relay import ChatRelay
+from modules.metrics import metrics
+from modules.ratelimit import RateLimiter
 
-VERIFICATION_CODE = "IF"
 
-connected_clients: List[WebSocket] = []
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    redis = await redis_conn.connect()
+    await authenticator.start(redis)
+    if redis:
+        dedupe.shared = RedisDedupeTier(redis)
+        cursors.client = redis
+        limiter.client = redis
+    broadcaster.start()
+    await history.start(redis)
+    hub.start(redis)
+    relay.start(redis)
+    forwarder.start()
+    yield
+    await forwarder.close()
+    await relay.close()
+    await hub.close()
+    await authenticator.close()
+    await broadcaster.close()
+    if redis:
+        await redis.aclose()
 
-message_cache = TTLCache(maxsize=512, ttl=60)
+
+app = FastAPI(debug=True, lifespan=lifespan)
+
+authenticator = Authenticator()
+
+broadcaster = Broadcaster()
+history = History()
+hub = RedisHub(broadcaster, history)
+relay = ChatRelay(hub)
+
+dedupe = DedupeStore()
+cursors = CursorStore()
+limiter = RateLimiter()
 
 
 class ChatEntry(BaseModel):
@@ -23,15 +65,27 @@ class ChatEntry(BaseModel):
     is_league_world: Optional[bool] = False
 
 
+chat_entries = TypeAdapter(List[ChatEntry])
+
+
 class WebSocketMessage(BaseModel):
     message_type: str
     message: Dict[str, Any]
 
 
+async def authenticate(request: Request) -> str:
+    return await authenticator.verify(request)
+
+
 @app.websocket("/recieve")
-async def websocket_endpoint(websocket: WebSocket):
+async def websocket_endpoint(
+    websocket: WebSocket,
+    clan: Optional[str] = None,
+    heartbeat: bool = False,
+    last_id: Optional[int] = None,
+):
     await websocket.accept()
-    connected_clients.append(websocket)
+    broadcaster.register(websocket, clan=clan, heartbeat=heartbeat)
 
     # Send connected message on connect
     connected_message = {
@@ -39,35 +93,157 @@ async def websocket_endpoint(websocket: WebSocket):
         "message": {"sender": "System", "message": "Connected to IF Chat"},
     }
 
-    await websocket.send_json(connected_message)
+    broadcaster.send(websocket, connected_message)
+
+    # Everything broadcast since the client's last seen frame, in one frame
+    if last_id is not None:
+        catch_up = history.catch_up(last_id)
+        if catch_up:
+            broadcaster.send(websocket, catch_up)
 
     try:
         while True:
             await websocket.receive_text()
+            broadcaster.touch(websocket)
     except WebSocketDisconnect:
-        connected_clients.remove(websocket)
+        pass
+    except RuntimeError:
+        # Closed from our side, e.g. reaped or evicted as a slow consumer
+        pass
+    finally:
+        broadcaster.unregister(websocket)
 
 
 @app.post("/send")
 async def send_clan_chats(
     entries: List[ChatEntry],
-    verification_code: str = Header(..., alias="verification-code"),
+    request: Request,
+    client_id: str = Depends(authenticate),
 ):
-    if verification_code != VERIFICATION_CODE:
-        raise HTTPException(status_code=403, detail="Invalid verification code")
+    clan_name = entries[0].clan_name if entries else ""
+    await check_rate_limit(request, client_id, clan_name)
     logger.info(entries)
-    new_entries = []
-    for entry in entries:
-        key = f"{entry.clan_name}:{entry.sender}:{entry.message}"
-        if key in message_cache:
-            continue
-        message_cache[key] = True
-        new_entries.append(entry)
+    forwarded, _ = await forward_new_entries(entries)
+
+    return {"received": len(entries), "forwarded": forwarded}
+
+
+@app.post("/v2/send")
+async def send_clan_chat_batch(
+    request: Request,
+    client_id: str = Depends(authenticate),
+):
+    """
+    Batch ingest, JSON or msgpack (`Content-Type`), optionally gzip'd (`Content-Encoding`).
+
+    Body: {"v": 1, "client_id": str, "session": str, "seq": int, "entries": [...]}
+    where `seq` is the sequence number of the first entry and each following
+    entry is one higher. Entries at or below the stored cursor for the client
+    session are skipped without being validated or hashed. Signed requests
+    use their authenticated client id instead of `client_id`.
+    """
+    started = time.perf_counter()
+    try:
+        batch = decode_batch(
+            await request.body(),
+            request.headers.get("content-type"),
+            request.headers.get("content-encoding"),
+        )
+    except DecodeError as e:
+        metrics.incr("ingest.decode_errors")
+        raise HTTPException(status_code=400, detail=str(e))
+    metrics.observe("ingest.decode_seconds", time.perf_counter() - started)
 
-    for entry in new_entries:
-        asyncio.create_task(forward_to_discord_bot(entry))
+    if batch.get("v", 1) != 1:
+        raise HTTPException(status_code=400, detail="Unsupported batch version")
 
-    return {"received": len(entries), "forwarded": len(new_entries)}
+    raw_entries = batch["entries"]
+    first = raw_entries[0] if raw_entries else None
+    clan_name = first.get("clan_name", "") if isinstance(first, dict) else ""
+    await check_rate_limit(request, client_id, str(clan_name))
+
+    seq = batch.get("seq")
+    cursor_key = None
+    if client_id == "legacy":
+        client_id = batch.get("client_id")
+    # bool is an int subclass, true/false are not sequence numbers
+    if isinstance(seq, bool):
+        raise HTTPException(status_code=400, detail="seq must be an integer")
+    skip = 0
+    if isinstance(seq, int) and client_id:
+        cursor_key = f"{client_id}:{batch.get('session', '')}"
+        cursor = await cursors.get(cursor_key)
+        skip = min(max(cursor - seq + 1, 0), len(raw_entries))
+        raw_entries = raw_entries[skip:]
+        metrics.incr("ingest.skipped_by_cursor", skip)
+
+    started = time.perf_counter()
+    try:
+        entries = chat_entries.validate_python(raw_entries)
+    except ValidationError as e:
+        metrics.incr("ingest.validation_errors")
+        raise HTTPException(status_code=422, detail=e.errors(include_url=False))
+    metrics.observe("ingest.validate_seconds", time.perf_counter() - started)
+
+    forwarded, handled = await forward_new_entries(entries)
+
+    last_seq = None
+    if cursor_key is not None:
+        # Only move past entries we kept, dropped ones must be accepted on resend
+        last_seq = seq + skip + handled - 1
+        await cursors.advance(cursor_key, last_seq)
+
+    return {
+        "v": 1,
+        "received": len(batch["entries"]),
+        "skipped": len(batch["entries"]) - len(entries),
+        "forwarded": forwarded,
+        "cursor": last_seq,
+    }
+
+
+async def check_rate_limit(request: Request, client_id: str, clan_name: str) -> None:
+    # Unsigned clients share the legacy code, tell them apart by address
+    if client_id == "legacy":
+        forwarded_for = request.headers.get("x-forwarded-for")
+        if forwarded_for:
+            client_id = forwarded_for.split(",")[0].strip()
+        elif request.client:
+            client_id = request.client.host
+    retry_after = await limiter.acquire(f"{client_id}:{clan_name}")
+    if retry_after:
+        raise HTTPException(
+            status_code=429,
+            detail="Rate limit exceeded",
+            headers={"Retry-After": str(math.ceil(retry_after))},
+        )
+
+
+async def forward_new_entries(entries: List[ChatEntry]) -> Tuple[int, int]:
+    """
+    Dedupe and enqueue entries for the bot.
+
+    Returns how many were forwarded and how many leading entries were
+    handled, forwarded or duplicates, before the queue filled up.
+    """
+    # Reject before touching the cache so the client can resend the same window
+    if not forwarder.has_capacity(len(entries)):
+        metrics.incr("forward.rejected_requests")
+        raise HTTPException(
+            status_code=503,
+            detail="Forwarding queue full",
+            headers={"Retry-After": "1"},
+        )
+    started = time.perf_counter()
+    new_entries = await dedupe.filter_new(entries)
+    metrics.observe("ingest.dedupe_seconds", time.perf_counter() - started)
+    forwarded = forwarder.submit(new_entries)
+    if forwarded == len(new_entries):
+        return forwarded, len(entries)
+    dropped = new_entries[forwarded:]
+    await dedupe.forget(dropped)
+    first_dropped = next(i for i, entry in enumerate(entries) if entry is dropped[0])
+    return forwarded, first_dropped
 
 
 @app.get("/send")
@@ -78,28 +254,31 @@ async def respond_heartbeat():
 @app.post("/publish")
 async def discord_to_runelite(
     payload: WebSocketMessage,
-    verification_code: str = Header(..., alias="verification-code"),
+    client_id: str = Depends(authenticate),
 ):
-    if verification_code != VERIFICATION_CODE:
-        raise HTTPException(status_code=403, detail="Invalid verification code")
 
-    disconnected = []
-    for ws in connected_clients:
-        try:
-            await ws.send_json(payload.model_dump())
-        except Exception:
-            disconnected.append(ws)
+    # Every worker fans the frame out to its own clients
+    workers = await hub.publish(payload.model_dump())
+
+    return {"status": "broadcasted", "workers": workers, "clients": len(broadcaster)}
+
+
+@app.get("/metrics")
+async def get_metrics(
+    client_id: str = Depends(authenticate),
+):
+    return {
+        "broadcast": broadcaster.stats(),
+        "forward": forwarder.stats(),
+        **metrics.snapshot(),
+    }
 
-    for ws in disconnected:
-        connected_clients.remove(ws)
 
-    return {"status": "broadcasted", "clients": len(connected_clients)}
+# --- Forward deduped entries to the Discord bot ---
 
 
-# --- Stub: forward message to Discord bot ---
+async def forward_to_discord_bot(entries: List[ChatEntry]):
+    await relay.forward([entry.model_dump() for entry in entries])
 
 
-async def forward_to_discord_bot(entry: ChatEntry):
-    # TODO: Implement actual forwarding here.
-    #   await httpx.post("https://discordbot/api/send", json=chat_payload.dict())
-    print(f"Forwarding to Discord bot: {entry.__repr__()}")
+forwarder = ForwardingPipeline(forward_to_discord_bot)
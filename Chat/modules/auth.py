@@ -0,0 +1,196 @@
+import asyncio
+import hashlib
+import hmac
+import time
+from typing import Optional
+
+from cachetools import TTLCache
+from fastapi import HTTPException, Request
+from loguru import logger
+from redis.asyncio import Redis
+
+from .metrics import metrics
+from .redis_conn import availability
+from .settings import env, env_bool, env_int
+
+
+class Authenticator:
+    """
+    HMAC request signing for the chat endpoints.
+
+    Signed requests carry `x-client-id`, `x-timestamp` (unix seconds) and
+    `x-signature`, the hex HMAC-SHA256 under the client's key of:
+
+        "{timestamp}\\n{METHOD}\\n{path}\\n{sha256 hex of the body}"
+
+    Keys live in the `chat:auth:keys` redis hash and are cached in memory.
+    After changing a key, publish its client id (or `*` for all keys) on
+    `chat:auth:invalidate` and every worker drops and reloads it, so lookups
+    stay in memory on the hot path. Unknown client ids are remembered briefly
+    in a cache of their own so they can't push real keys out.
+
+    Signatures are single use across every worker, recorded with `SET NX` in
+    redis for the replay window, the local cache only short-circuits repeats
+    seen by this worker.
+
+    The legacy `verification-code` header is still accepted while
+    CHAT_ALLOW_LEGACY_AUTH is true.
+    """
+
+    keys_hash = "chat:auth:keys"
+    signature_prefix = "chat:auth:sig:"
+    invalidate_channel = "chat:auth:invalidate"
+
+    def __init__(
+        self,
+        legacy_code: str = env("CHAT_HEADER_SECRET", "IF"),
+        allow_legacy: bool = env_bool("CHAT_ALLOW_LEGACY_AUTH", True),
+        replay_window: int = env_int("CHAT_AUTH_REPLAY_WINDOW", 30),
+        key_ttl: int = env_int("CHAT_AUTH_KEY_TTL", 3600),
+        unknown_ttl: int = env_int("CHAT_AUTH_UNKNOWN_TTL", 30),
+    ):
+        self.legacy_code = legacy_code.encode()
+        self.allow_legacy = allow_legacy
+        self.replay_window = replay_window
+        self.keys: TTLCache = TTLCache(maxsize=10_000, ttl=key_ttl)
+        self.unknown: TTLCache = TTLCache(maxsize=1_000, ttl=unknown_ttl)
+        self.seen_signatures: TTLCache = TTLCache(
+            maxsize=100_000, ttl=replay_window * 2
+        )
+        self.client: Optional[Redis] = None
+        self.listener: Optional[asyncio.Task] = None
+
+    async def start(self, client: Optional[Redis]) -> None:
+        self.client = client
+        if not client:
+            return
+        try:
+            await self._load_all()
+        except Exception as e:
+            logger.warning(f"Could not preload client keys: {e}")
+        self.listener = asyncio.create_task(self._listen())
+
+    async def _load_all(self) -> None:
+        keys = await self.client.hgetall(self.keys_hash)
+        for client_id, key in keys.items():
+            self.keys[client_id] = key.encode()
+        logger.info(f"Loaded {len(keys)} client keys")
+
+    async def _get_key(self, client_id: str) -> Optional[bytes]:
+        key = self.keys.get(client_id)
+        if key is not None or client_id in self.unknown:
+            return key
+        metrics.incr("auth.key_cache_misses")
+        if self.client:
+            try:
+                key = await self.client.hget(self.keys_hash, client_id)
+            except Exception as e:
+                logger.warning(f"Key lookup failed for {client_id}: {e}")
+                return None
+        if key:
+            key = self.keys[client_id] = key.encode()
+        else:
+            self.unknown[client_id] = True
+        return key
+
+    async def _first_use(self, signature: str) -> bool:
+        """Record a signature, False if it was already used on any worker."""
+        if signature in self.seen_signatures:
+            return False
+        self.seen_signatures[signature] = True
+        if self.client and availability.up:
+            try:
+                return bool(
+                    await self.client.set(
+                        self.signature_prefix + signature,
+                        1,
+                        nx=True,
+                        ex=self.replay_window * 2,
+                    )
+                )
+            except Exception as e:
+                availability.failed(e)
+                logger.debug(f"Shared replay check unavailable: {e}")
+        return True
+
+    async def _listen(self) -> None:
+        while True:
+            sub = None
+            try:
+                sub = self.client.pubsub(ignore_subscribe_messages=True)
+                await sub.subscribe(self.invalidate_channel)
+                async for message in sub.listen():
+                    if message["type"] != "message":
+                        continue
+                    if message["data"] == "*":
+                        self.keys.clear()
+                        self.unknown.clear()
+                        await self._load_all()
+                    else:
+                        self.keys.pop(message["data"], None)
+                        self.unknown.pop(message["data"], None)
+                        await self._get_key(message["data"])
+                    metrics.incr("auth.invalidations")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Lost key invalidation subscription: {e}")
+                # Keys may have changed while we were not listening
+                self.keys.clear()
+                self.unknown.clear()
+            finally:
+                if sub is not None:
+                    try:
+                        await sub.aclose()
+                    except Exception:
+                        pass
+            await asyncio.sleep(5)
+
+    async def verify(self, request: Request) -> str:
+        """Returns the authenticated client id, raises 401/403 otherwise."""
+        signature = request.headers.get("x-signature")
+        if signature is None:
+            return self._verify_legacy(request)
+
+        client_id = request.headers.get("x-client-id", "")
+        try:
+            timestamp = int(request.headers.get("x-timestamp", ""))
+        except ValueError:
+            raise HTTPException(status_code=401, detail="Invalid timestamp")
+        if abs(time.time() - timestamp) > self.replay_window:
+            metrics.incr("auth.expired")
+            raise HTTPException(status_code=401, detail="Request expired")
+
+        key = await self._get_key(client_id)
+        if key is None:
+            metrics.incr("auth.rejected")
+            raise HTTPException(status_code=403, detail="Invalid signature")
+
+        body_hash = hashlib.sha256(await request.body()).hexdigest()
+        signed = f"{timestamp}\n{request.method}\n{request.url.path}\n{body_hash}"
+        expected = hmac.new(key, signed.encode(), hashlib.sha256).hexdigest()
+        if not hmac.compare_digest(expected.encode(), signature.encode()):
+            metrics.incr("auth.rejected")
+            raise HTTPException(status_code=403, detail="Invalid signature")
+
+        if not await self._first_use(signature):
+            metrics.incr("auth.replayed")
+            raise HTTPException(status_code=403, detail="Replayed request")
+        return client_id
+
+    def _verify_legacy(self, request: Request) -> str:
+        code = request.headers.get("verification-code")
+        if (
+            not self.allow_legacy
+            or code is None
+            or not hmac.compare_digest(code.encode(), self.legacy_code)
+        ):
+            metrics.incr("auth.rejected")
+            raise HTTPException(status_code=403, detail="Invalid verification code")
+        return "legacy"
+
+    async def close(self) -> None:
+        if self.listener:
+            self.listener.cancel()
+            await asyncio.gather(self.listener, return_exceptions=True)
+            self.listener = None
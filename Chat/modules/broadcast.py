@@ -0,0 +1,230 @@
+import asyncio
+import json
+import time
+from collections import Counter
+from enum import Enum
+from typing import Any, Dict, Optional
+
+from fastapi import WebSocket
+from loguru import logger
+
+from .metrics import metrics
+from .settings import env, env_float, env_int
+
+HEARTBEAT_FRAME = '{"message_type":"Ping","message":{}}'
+
+
+class SlowConsumerPolicy(str, Enum):
+    # Discard the frame being broadcast, keep what is already queued
+    DROP_NEWEST = "drop_newest"
+    # Coalesce: discard the oldest queued frame so the client catches up
+    DROP_OLDEST = "drop_oldest"
+    # Close the client, it will have to reconnect
+    DISCONNECT = "disconnect"
+
+
+class Connection:
+    """A registered websocket, its outbound queue and writer task."""
+
+    __slots__ = (
+        "websocket",
+        "queue",
+        "task",
+        "evicted",
+        "clan",
+        "heartbeat",
+        "connected_since",
+        "last_seen",
+    )
+
+    def __init__(
+        self,
+        websocket: WebSocket,
+        queue_size: int,
+        clan: Optional[str] = None,
+        heartbeat: bool = False,
+    ):
+        self.websocket = websocket
+        self.queue: asyncio.Queue[str] = asyncio.Queue(maxsize=queue_size)
+        self.task: Optional[asyncio.Task] = None
+        self.evicted = False
+        self.clan = clan
+        self.heartbeat = heartbeat
+        self.connected_since = time.time()
+        self.last_seen = time.monotonic()
+
+
+class Broadcaster:
+    """
+    Registry of connected websockets and fan-out of frames to them.
+
+    Each websocket gets a bounded outbound queue drained by its own writer
+    task, so a slow client only ever delays itself. Payloads are serialized
+    once per broadcast and the same text frame is queued for every client.
+
+    Clients that connect with `heartbeat` enabled are sent a Ping frame after
+    `heartbeat_interval` seconds of silence and are reaped once they have not
+    sent anything for `idle_timeout` seconds. Other clients are left to the
+    transport level websocket pings uvicorn sends, and every client is dropped
+    as soon as a send to it fails.
+    """
+
+    def __init__(
+        self,
+        queue_size: int = env_int("CHAT_SEND_QUEUE_SIZE", 64),
+        policy: str = env("CHAT_SLOW_CONSUMER_POLICY", "drop_oldest"),
+        send_timeout: float = env_float("CHAT_SEND_TIMEOUT", 5),
+        heartbeat_interval: float = env_float("CHAT_HEARTBEAT_INTERVAL", 15),
+        idle_timeout: float = env_float("CHAT_IDLE_TIMEOUT", 45),
+    ):
+        self.queue_size = queue_size
+        self.policy = SlowConsumerPolicy(policy)
+        self.send_timeout = send_timeout
+        self.heartbeat_interval = heartbeat_interval
+        self.idle_timeout = idle_timeout
+        self.connections: Dict[WebSocket, Connection] = {}
+        self.reaper: Optional[asyncio.Task] = None
+
+    def __len__(self) -> int:
+        return len(self.connections)
+
+    def start(self) -> None:
+        if not self.reaper:
+            self.reaper = asyncio.create_task(self._reap())
+
+    @staticmethod
+    def serialize(payload: Dict[str, Any]) -> str:
+        # Same encoding starlette uses for `send_json`
+        return json.dumps(payload, separators=(",", ":"), ensure_ascii=False)
+
+    def register(
+        self,
+        websocket: WebSocket,
+        clan: Optional[str] = None,
+        heartbeat: bool = False,
+    ) -> Connection:
+        connection = Connection(websocket, self.queue_size, clan, heartbeat)
+        connection.task = asyncio.create_task(self._writer(connection))
+        self.connections[websocket] = connection
+        metrics.incr("broadcast.registered")
+        return connection
+
+    def unregister(self, websocket: WebSocket) -> None:
+        connection = self.connections.pop(websocket, None)
+        if connection and connection.task:
+            connection.task.cancel()
+
+    def touch(self, websocket: WebSocket) -> None:
+        """Record that the client sent us something."""
+        connection = self.connections.get(websocket)
+        if connection:
+            connection.last_seen = time.monotonic()
+
+    def send(self, websocket: WebSocket, payload: Dict[str, Any]) -> bool:
+        """Queue a frame for a single client."""
+        connection = self.connections.get(websocket)
+        if connection is None:
+            return False
+        return self._offer(connection, self.serialize(payload))
+
+    def broadcast(self, payload: Dict[str, Any]) -> int:
+        return self.broadcast_text(self.serialize(payload))
+
+    def broadcast_text(self, text: str) -> int:
+        """Queue an already serialized frame for every client, returns the number queued."""
+        metrics.incr("broadcast.messages")
+        queued = 0
+        for connection in list(self.connections.values()):
+            if self._offer(connection, text):
+                queued += 1
+        return queued
+
+    def _offer(self, connection: Connection, text: str) -> bool:
+        try:
+            connection.queue.put_nowait(text)
+            return True
+        except asyncio.QueueFull:
+            pass
+
+        if self.policy is SlowConsumerPolicy.DROP_NEWEST:
+            metrics.incr("broadcast.dropped")
+            return False
+
+        if self.policy is SlowConsumerPolicy.DROP_OLDEST:
+            connection.queue.get_nowait()
+            connection.queue.put_nowait(text)
+            metrics.incr("broadcast.coalesced")
+            return True
+
+        logger.warning("Disconnecting slow websocket client")
+        metrics.incr("broadcast.evicted")
+        self._evict(connection)
+        return False
+
+    def _evict(self, connection: Connection) -> None:
+        connection.evicted = True
+        self.unregister(connection.websocket)
+
+    async def _writer(self, connection: Connection) -> None:
+        websocket = connection.websocket
+        try:
+            while True:
+                text = await connection.queue.get()
+                await asyncio.wait_for(websocket.send_text(text), self.send_timeout)
+                metrics.incr("broadcast.frames_sent")
+        except asyncio.CancelledError:
+            if connection.evicted:
+                try:
+                    await websocket.close(code=1013)
+                except Exception:
+                    pass
+            raise
+        except Exception as e:
+            logger.debug(f"Websocket send failed, dropping client: {e}")
+            metrics.incr("broadcast.send_failures")
+            # Close so the client notices and reconnects instead of sitting unregistered
+            try:
+                await websocket.close(code=1011)
+            except Exception:
+                pass
+        finally:
+            if self.connections.get(websocket) is connection:
+                del self.connections[websocket]
+
+    async def _reap(self) -> None:
+        while True:
+            await asyncio.sleep(self.heartbeat_interval)
+            now = time.monotonic()
+            for connection in list(self.connections.values()):
+                if not connection.heartbeat:
+                    continue
+                idle = now - connection.last_seen
+                if idle > self.idle_timeout:
+                    logger.debug(f"Reaping websocket idle for {idle:.0f}s")
+                    metrics.incr("broadcast.reaped")
+                    self._evict(connection)
+                elif idle >= self.heartbeat_interval:
+                    self._offer(connection, HEARTBEAT_FRAME)
+
+    async def close(self) -> None:
+        tasks = [c.task for c in self.connections.values() if c.task]
+        if self.reaper:
+            tasks.append(self.reaper)
+            self.reaper = None
+        self.connections.clear()
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def stats(self) -> Dict[str, Any]:
+        connections = list(self.connections.values())
+        return {
+            "clients": len(connections),
+            "heartbeat_clients": sum(1 for c in connections if c.heartbeat),
+            "clans": dict(Counter(c.clan for c in connections if c.clan)),
+            "oldest_connected_since": min(
+                (c.connected_since for c in connections), default=None
+            ),
+            "queued_frames": sum(c.queue.qsize() for c in connections),
+            "policy": self.policy.value,
+        }
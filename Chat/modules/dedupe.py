@@ -0,0 +1,118 @@
+import hashlib
+from typing import Any, List, Optional
+
+from cachetools import TTLCache
+from loguru import logger
+from redis.asyncio import Redis
+
+from .metrics import metrics
+from .redis_conn import availability
+from .settings import env_int
+
+DEDUPE_TTL = env_int("CHAT_DEDUPE_TTL", 60)
+
+
+class LocalDedupeTier:
+    """In-process front tier, absorbs repeats reported by clients on this worker."""
+
+    name = "local"
+
+    def __init__(
+        self,
+        maxsize: int = env_int("CHAT_DEDUPE_LOCAL_SIZE", 8192),
+        ttl: int = DEDUPE_TTL,
+    ):
+        self.cache = TTLCache(maxsize=maxsize, ttl=ttl)
+
+    async def check_and_set(self, keys: List[bytes]) -> List[bool]:
+        fresh = []
+        for key in keys:
+            if key in self.cache:
+                fresh.append(False)
+            else:
+                self.cache[key] = True
+                fresh.append(True)
+        return fresh
+
+    async def forget(self, keys: List[bytes]) -> None:
+        for key in keys:
+            self.cache.pop(key, None)
+
+
+class RedisDedupeTier:
+    """Shared tier, `SET NX EX` per key so every worker agrees on the first sighting."""
+
+    name = "redis"
+    prefix = b"chat:dedupe:"
+
+    def __init__(self, client: Redis, ttl: int = DEDUPE_TTL):
+        self.client = client
+        self.ttl = ttl
+
+    async def check_and_set(self, keys: List[bytes]) -> List[bool]:
+        pipe = self.client.pipeline(transaction=False)
+        for key in keys:
+            pipe.set(self.prefix + key, 1, nx=True, ex=self.ttl)
+        return [bool(result) for result in await pipe.execute()]
+
+    async def forget(self, keys: List[bytes]) -> None:
+        await self.client.delete(*[self.prefix + key for key in keys])
+
+
+class DedupeStore:
+    """
+    Two tier dedupe of chat entries.
+
+    Keys go through the local tier first, only keys it has not seen are sent
+    to the shared tier. If the shared tier errors, or redis was recently
+    unreachable, the local verdict stands.
+    """
+
+    def __init__(self, local: Optional[LocalDedupeTier] = None, shared=None):
+        self.local = local or LocalDedupeTier()
+        self.shared = shared
+
+    @staticmethod
+    def key(clan_name: str, sender: str, message: str) -> bytes:
+        raw = f"{clan_name}\x1f{sender}\x1f{message}".encode()
+        return hashlib.blake2b(raw, digest_size=16).digest()
+
+    async def filter_new(self, entries: List[Any]) -> List[Any]:
+        keys = [self.key(e.clan_name, e.sender, e.message) for e in entries]
+
+        fresh = await self.local.check_and_set(keys)
+        candidates = [i for i, is_new in enumerate(fresh) if is_new]
+        self._record(self.local.name, len(entries), len(candidates))
+
+        if self.shared and candidates and availability.up:
+            try:
+                shared_fresh = await self.shared.check_and_set(
+                    [keys[i] for i in candidates]
+                )
+            except Exception as e:
+                availability.failed(e)
+                logger.warning(f"Shared dedupe unavailable, using local only: {e}")
+                metrics.incr(f"dedupe.{self.shared.name}.errors")
+            else:
+                self._record(
+                    self.shared.name, len(candidates), sum(shared_fresh)
+                )
+                candidates = [i for i, ok in zip(candidates, shared_fresh) if ok]
+
+        return [entries[i] for i in candidates]
+
+    async def forget(self, entries: List[Any]) -> None:
+        """Unmark entries that were accepted but never forwarded, so a resend gets through."""
+        keys = [self.key(e.clan_name, e.sender, e.message) for e in entries]
+        await self.local.forget(keys)
+        if self.shared and availability.up:
+            try:
+                await self.shared.forget(keys)
+            except Exception as e:
+                availability.failed(e)
+                logger.warning(f"Could not unmark dropped entries: {e}")
+
+    @staticmethod
+    def _record(tier: str, checked: int, misses: int) -> None:
+        metrics.incr(f"dedupe.{tier}.hits", checked - misses)
+        metrics.incr(f"dedupe.{tier}.misses", misses)
@@ -0,0 +1,106 @@
+import asyncio
+import time
+from typing import Any, Awaitable, Callable, Dict, List
+
+from loguru import logger
+
+from .metrics import metrics
+from .settings import env_float, env_int
+
+
+class ForwardingPipeline:
+    """
+    Bounded queue drained by a fixed pool of workers.
+
+    Workers coalesce whatever is queued (up to `batch_size`, waiting at most
+    `linger` seconds for more) and hand the batch to `handler` in one call.
+    """
+
+    def __init__(
+        self,
+        handler: Callable[[List[Any]], Awaitable[None]],
+        queue_size: int = env_int("CHAT_FORWARD_QUEUE_SIZE", 5000),
+        workers: int = env_int("CHAT_FORWARD_WORKERS", 4),
+        batch_size: int = env_int("CHAT_FORWARD_BATCH_SIZE", 50),
+        linger: float = env_float("CHAT_FORWARD_LINGER", 0.05),
+    ):
+        self.handler = handler
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self.worker_count = workers
+        self.batch_size = batch_size
+        self.linger = linger
+        self.workers: List[asyncio.Task] = []
+
+    def start(self) -> None:
+        if self.workers:
+            return
+        self.workers = [
+            asyncio.create_task(self._worker()) for _ in range(self.worker_count)
+        ]
+        logger.info(f"Forwarding pipeline started with {self.worker_count} workers")
+
+    def has_capacity(self, count: int) -> bool:
+        return self.queue.maxsize - self.queue.qsize() >= count
+
+    def submit(self, items: List[Any]) -> int:
+        """Enqueue without waiting, returns how many items were accepted."""
+        accepted = 0
+        for item in items:
+            try:
+                self.queue.put_nowait(item)
+                accepted += 1
+            except asyncio.QueueFull:
+                metrics.incr("forward.dropped", len(items) - accepted)
+                break
+        metrics.incr("forward.enqueued", accepted)
+        return accepted
+
+    async def _next_batch(self) -> List[Any]:
+        batch = [await self.queue.get()]
+        deadline = time.monotonic() + self.linger
+        while len(batch) < self.batch_size:
+            if not self.queue.empty():
+                batch.append(self.queue.get_nowait())
+                continue
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self.queue.get(), remaining))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _worker(self) -> None:
+        while True:
+            batch = await self._next_batch()
+            started = time.perf_counter()
+            try:
+                await self.handler(batch)
+                metrics.incr("forward.batches")
+                metrics.incr("forward.forwarded", len(batch))
+            except Exception as e:
+                logger.error(f"Failed to forward batch of {len(batch)}: {e}")
+                metrics.incr("forward.failed", len(batch))
+            finally:
+                metrics.observe("forward.batch_seconds", time.perf_counter() - started)
+                for _ in batch:
+                    self.queue.task_done()
+
+    async def close(self, timeout: float = 5) -> None:
+        """Give queued items a chance to drain, then stop the workers."""
+        try:
+            await asyncio.wait_for(self.queue.join(), timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"Dropping {self.queue.qsize()} queued entries on shutdown")
+        for task in self.workers:
+            task.cancel()
+        await asyncio.gather(*self.workers, return_exceptions=True)
+        self.workers = []
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "depth": self.queue.qsize(),
+            "capacity": self.queue.maxsize,
+            "workers": len(self.workers),
+        }
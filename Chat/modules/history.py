@@ -0,0 +1,109 @@
+import json
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+from loguru import logger
+from redis.asyncio import Redis
+
+from .metrics import metrics
+from .redis_conn import availability
+from .settings import env, env_int
+
+
+class History:
+    """
+    Ring buffer of recently broadcast frames for reconnecting clients.
+
+    Every published frame is stamped with an `id` that increases across all
+    workers (an INCR in redis, a local counter without it) and mirrored to a
+    capped redis stream. Each worker keeps the most recent frames in memory
+    and seeds them from the stream on startup, so clients reconnecting after
+    a deploy can still catch up.
+    """
+
+    seq_key = "chat:history:seq"
+
+    def __init__(
+        self,
+        size: int = env_int("CHAT_HISTORY_SIZE", 500),
+        stream: str = env("CHAT_HISTORY_STREAM", "chat:history"),
+    ):
+        self.size = size
+        self.stream = stream
+        self.buffer: Deque[Tuple[int, Dict[str, Any]]] = deque(maxlen=size)
+        self.last_id = 0
+        self.client: Optional[Redis] = None
+
+    async def start(self, client: Optional[Redis]) -> None:
+        self.client = client
+        if not client:
+            return
+        try:
+            entries = await client.xrevrange(self.stream, count=self.size)
+        except Exception as e:
+            logger.warning(f"Could not load broadcast history: {e}")
+            return
+        for _, fields in reversed(entries):
+            self.observe(fields["frame"])
+        logger.info(f"Loaded {len(entries)} frames of broadcast history")
+
+    async def stamp(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        """Assign the next id to a frame."""
+        frame_id = None
+        if self.client and availability.up:
+            try:
+                frame_id = await self.client.incr(self.seq_key)
+            except Exception as e:
+                availability.failed(e)
+                logger.debug(f"Shared history id unavailable: {e}")
+        if frame_id is None or frame_id <= self.last_id:
+            frame_id = self.last_id + 1
+        self.last_id = frame_id
+        return {**payload, "id": frame_id}
+
+    async def mirror(self, text: str) -> None:
+        """Append a serialized, stamped frame to the redis history stream."""
+        if not self.client or not availability.up:
+            return
+        try:
+            await self.client.xadd(
+                self.stream, {"frame": text}, maxlen=self.size, approximate=True
+            )
+        except Exception as e:
+            availability.failed(e)
+            logger.debug(f"Could not mirror frame to history stream: {e}")
+
+    def observe(self, text: str) -> None:
+        """Keep a broadcast frame, called by every worker for every frame it fans out."""
+        try:
+            frame = json.loads(text)
+            frame_id = int(frame["id"])
+        except (ValueError, KeyError, TypeError):
+            return
+        self.buffer.append((frame_id, frame))
+        if frame_id > self.last_id:
+            self.last_id = frame_id
+
+    def since(self, last_id: int) -> Tuple[List[Dict[str, Any]], bool]:
+        """Frames newer than `last_id`, and whether older ones have been evicted."""
+        frames = sorted(
+            (item for item in self.buffer if item[0] > last_id), key=lambda i: i[0]
+        )
+        oldest = self.buffer[0][0] if self.buffer else self.last_id + 1
+        truncated = last_id < oldest - 1 and len(self.buffer) == self.size
+        metrics.incr("history.catchup_frames", len(frames))
+        return [frame for _, frame in frames], truncated
+
+    def catch_up(self, last_id: int) -> Optional[Dict[str, Any]]:
+        """A single frame carrying everything broadcast after `last_id`, if anything."""
+        frames, truncated = self.since(last_id)
+        if not frames:
+            return None
+        return {
+            "message_type": "CatchUp",
+            "message": {
+                "frames": frames,
+                "last_id": frames[-1]["id"],
+                "truncated": truncated,
+            },
+        }
@@ -0,0 +1,106 @@
+import asyncio
+from typing import Any, Dict, Optional
+
+from loguru import logger
+from redis.asyncio import Redis
+from redis.asyncio.client import PubSub
+
+from .broadcast import Broadcaster
+from .history import History
+from .metrics import metrics
+from .redis_conn import availability
+from .settings import env
+
+
+class RedisHub:
+    """
+    Cross-worker fan-out over a redis channel.
+
+    `publish` sends the serialized frame to the channel and every worker,
+    including the one that published, hands it to its local broadcaster.
+    Without redis, or while redis is unreachable, frames go straight to the
+    local broadcaster. Frames are stamped and recorded in `history` when set.
+    """
+
+    def __init__(
+        self,
+        broadcaster: Broadcaster,
+        history: Optional[History] = None,
+        channel: str = env("CHAT_BROADCAST_CHANNEL", "chat:broadcast"),
+    ):
+        self.broadcaster = broadcaster
+        self.history = history
+        self.channel = channel
+        self.client: Optional[Redis] = None
+        self.listener: Optional[asyncio.Task] = None
+        self.subscribed = False
+
+    def start(self, client: Optional[Redis]) -> None:
+        self.client = client
+        if client and not self.listener:
+            self.listener = asyncio.create_task(self._listen())
+
+    async def subscribe(self) -> PubSub:
+        logger.info(f"Subscribing to {self.channel}")
+        sub = self.client.pubsub(ignore_subscribe_messages=True)
+        await sub.subscribe(self.channel)
+        return sub
+
+    async def publish(self, payload: Dict[str, Any]) -> int:
+        """Returns the number of workers that received the frame."""
+        if self.history:
+            payload = await self.history.stamp(payload)
+        text = self.broadcaster.serialize(payload)
+        if self.history:
+            await self.history.mirror(text)
+        if self.client and self.subscribed and availability.up:
+            try:
+                receivers = await self.client.publish(self.channel, text)
+                metrics.incr("hub.published")
+                return receivers
+            except Exception as e:
+                availability.failed(e)
+                logger.warning(f"Redis publish failed, broadcasting locally: {e}")
+        metrics.incr("hub.local_fallback")
+        self._fan_out(text)
+        return 1
+
+    def _fan_out(self, text: str) -> None:
+        if self.history:
+            self.history.observe(text)
+        self.broadcaster.broadcast_text(text)
+
+    async def _listen(self) -> None:
+        retries = 0
+        while True:
+            sub = None
+            try:
+                sub = await self.subscribe()
+                self.subscribed = True
+                retries = 0
+                async for message in sub.listen():
+                    if message["type"] != "message":
+                        continue
+                    metrics.incr("hub.received")
+                    self._fan_out(message["data"])
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                retries = min(retries + 1, 5)
+                logger.warning(
+                    f"Lost {self.channel} subscription, retrying in {2**retries} seconds: {e}"
+                )
+            finally:
+                self.subscribed = False
+                if sub is not None:
+                    try:
+                        await sub.aclose()
+                    except Exception:
+                        pass
+            await asyncio.sleep(2**retries)
+
+    async def close(self) -> None:
+        if self.listener:
+            self.listener.cancel()
+            await asyncio.gather(self.listener, return_exceptions=True)
+            self.listener = None
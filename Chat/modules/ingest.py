@@ -0,0 +1,112 @@
+import json
+import zlib
+from typing import Any, Dict, Optional
+
+import msgpack
+from cachetools import TTLCache
+from loguru import logger
+from redis.asyncio import Redis
+
+from .metrics import metrics
+from .redis_conn import availability
+from .settings import env_int
+
+MAX_BATCH_BYTES = env_int("CHAT_MAX_BATCH_BYTES", 1024 * 1024)
+
+JSON_TYPES = {"application/json"}
+MSGPACK_TYPES = {"application/msgpack", "application/x-msgpack", "application/vnd.msgpack"}
+
+
+class DecodeError(ValueError):
+    pass
+
+
+def _gunzip(body: bytes) -> bytes:
+    # Bounded so a small compressed body cannot expand without limit
+    decompressor = zlib.decompressobj(wbits=16 + zlib.MAX_WBITS)
+    try:
+        data = decompressor.decompress(body, MAX_BATCH_BYTES)
+    except zlib.error as e:
+        raise DecodeError(f"Invalid gzip body: {e}")
+    if decompressor.unconsumed_tail:
+        raise DecodeError("Decompressed body too large")
+    return data
+
+
+def decode_batch(
+    body: bytes, content_type: Optional[str], content_encoding: Optional[str]
+) -> Dict[str, Any]:
+    """Decode a batch ingest body, gzip'd or not, in JSON or msgpack."""
+    if len(body) > MAX_BATCH_BYTES:
+        raise DecodeError("Body too large")
+    if content_encoding and content_encoding.strip().lower() == "gzip":
+        body = _gunzip(body)
+    metrics.incr("ingest.bytes", len(body))
+
+    media_type = (content_type or "application/json").split(";")[0].strip().lower()
+    try:
+        if media_type in MSGPACK_TYPES:
+            batch = msgpack.unpackb(body, raw=False)
+        elif media_type in JSON_TYPES:
+            batch = json.loads(body)
+        else:
+            raise DecodeError(f"Unsupported content type: {media_type}")
+    except (ValueError, msgpack.UnpackException) as e:
+        raise DecodeError(f"Invalid body: {e}")
+
+    if not isinstance(batch, dict) or not isinstance(batch.get("entries"), list):
+        raise DecodeError("Batch must be an object with an entries list")
+    return batch
+
+
+class CursorStore:
+    """
+    Highest entry sequence number seen per client session.
+
+    Kept locally and, when redis is available, shared between workers. A
+    stale cursor only means some entries fall through to the dedupe store.
+    """
+
+    prefix = "chat:cursor:"
+    _advance_script = """
+    local current = tonumber(redis.call('GET', KEYS[1]) or '-1')
+    local seq = tonumber(ARGV[1])
+    if seq > current then
+        redis.call('SET', KEYS[1], seq, 'EX', ARGV[2])
+        return seq
+    end
+    return current
+    """
+
+    def __init__(
+        self,
+        client: Optional[Redis] = None,
+        ttl: int = env_int("CHAT_CURSOR_TTL", 3600),
+    ):
+        self.client = client
+        self.ttl = ttl
+        self.local = TTLCache(maxsize=10_000, ttl=ttl)
+
+    async def get(self, key: str) -> int:
+        cursor = self.local.get(key, -1)
+        if self.client and availability.up:
+            try:
+                shared = await self.client.get(self.prefix + key)
+                if shared is not None:
+                    cursor = max(cursor, int(shared))
+            except Exception as e:
+                availability.failed(e)
+                logger.debug(f"Shared cursor unavailable: {e}")
+        return cursor
+
+    async def advance(self, key: str, seq: int) -> None:
+        if seq > self.local.get(key, -1):
+            self.local[key] = seq
+        if self.client and availability.up:
+            try:
+                await self.client.eval(
+                    self._advance_script, 1, self.prefix + key, seq, self.ttl
+                )
+            except Exception as e:
+                availability.failed(e)
+                logger.debug(f"Could not advance shared cursor: {e}")
@@ -0,0 +1,31 @@
+from collections import defaultdict
+from typing import Any, Dict
+
+
+class Metrics:
+    """Process-local counters and timings, exposed through `/metrics`."""
+
+    def __init__(self):
+        self.counters: Dict[str, int] = defaultdict(int)
+        self.timings: Dict[str, Dict[str, float]] = {}
+
+    def incr(self, name: str, amount: int = 1) -> None:
+        self.counters[name] += amount
+
+    def observe(self, name: str, seconds: float) -> None:
+        timing = self.timings.get(name)
+        if timing is None:
+            timing = self.timings[name] = {"count": 0, "total": 0.0, "max": 0.0}
+        timing["count"] += 1
+        timing["total"] += seconds
+        if seconds > timing["max"]:
+            timing["max"] = seconds
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "counters": dict(self.counters),
+            "timings": {name: dict(values) for name, values in self.timings.items()},
+        }
+
+
+metrics = Metrics()
@@ -0,0 +1,96 @@
+import time
+from typing import Optional
+
+from cachetools import TTLCache
+from loguru import logger
+from redis.asyncio import Redis
+
+from .metrics import metrics
+from .redis_conn import availability
+from .settings import env_bool, env_float
+
+
+class _Bucket:
+    __slots__ = ("tokens", "updated")
+
+    def __init__(self, tokens: float, updated: float):
+        self.tokens = tokens
+        self.updated = updated
+
+
+class RateLimiter:
+    """
+    Token bucket per key, `rate` tokens a second up to `burst`.
+
+    Buckets are kept in-process by default. With `shared` set and redis
+    available the bucket lives in redis so all workers draw from the same
+    one, falling back to the local bucket if redis errors.
+    """
+
+    prefix = "chat:ratelimit:"
+    _script = """
+    local rate = tonumber(ARGV[1])
+    local burst = tonumber(ARGV[2])
+    local cost = tonumber(ARGV[3])
+    local time = redis.call('TIME')
+    local now = tonumber(time[1]) + tonumber(time[2]) / 1000000
+    local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'updated')
+    local tokens = tonumber(bucket[1]) or burst
+    local updated = tonumber(bucket[2]) or now
+    tokens = math.min(burst, tokens + (now - updated) * rate)
+    local retry_after = 0
+    if tokens >= cost then
+        tokens = tokens - cost
+    else
+        retry_after = (cost - tokens) / rate
+    end
+    redis.call('HSET', KEYS[1], 'tokens', tokens, 'updated', now)
+    redis.call('EXPIRE', KEYS[1], math.ceil(burst / rate) + 1)
+    return tostring(retry_after)
+    """
+
+    def __init__(
+        self,
+        rate: float = env_float("CHAT_RATE_LIMIT", 5),
+        burst: float = env_float("CHAT_RATE_BURST", 20),
+        shared: bool = env_bool("CHAT_RATE_LIMIT_SHARED", False),
+    ):
+        self.rate = rate
+        self.burst = burst
+        self.shared = shared
+        self.client: Optional[Redis] = None
+        self.buckets: TTLCache = TTLCache(
+            maxsize=50_000, ttl=max(burst / rate * 2, 60)
+        )
+
+    async def acquire(self, key: str, cost: float = 1) -> float:
+        """Take `cost` tokens, returns 0 if allowed or the seconds until it would be."""
+        retry_after = None
+        if self.shared and self.client and availability.up:
+            try:
+                retry_after = float(
+                    await self.client.eval(
+                        self._script, 1, self.prefix + key, self.rate, self.burst, cost
+                    )
+                )
+            except Exception as e:
+                availability.failed(e)
+                logger.debug(f"Shared rate limit unavailable: {e}")
+                metrics.incr("ratelimit.shared_errors")
+        if retry_after is None:
+            retry_after = self._acquire_local(key, cost)
+
+        metrics.incr("ratelimit.limited" if retry_after else "ratelimit.allowed")
+        return retry_after
+
+    def _acquire_local(self, key: str, cost: float) -> float:
+        now = time.monotonic()
+        bucket = self.buckets.get(key)
+        if bucket is None:
+            bucket = self.buckets[key] = _Bucket(self.burst, now)
+        bucket.tokens = min(self.burst, bucket.tokens + (now - bucket.updated) * self.rate)
+        bucket.updated = now
+        if bucket.tokens >= cost:
+            bucket.tokens -= cost
+            return 0
+        return (cost - bucket.tokens) / self.rate
@@ -0,0 +1,87 @@
+import os
+import time
+from typing import Optional
+
+from loguru import logger
+from redis.asyncio import Redis
+from redis.asyncio.retry import Retry
+from redis.backoff import NoBackoff
+from redis.exceptions import ConnectionError, TimeoutError
+
+from .metrics import metrics
+from .settings import env_float, env_int
+
+
+class Availability:
+    """
+    Cheap gate for redis calls on the request path.
+
+    After a connection error or timeout redis is treated as down for
+    `cooldown` seconds, callers skip it and use their local fallback straight
+    away instead of waiting on a dead socket for every request.
+    """
+
+    def __init__(self, cooldown: float = env_float("CHAT_REDIS_COOLDOWN", 5)):
+        self.cooldown = cooldown
+        self.down_until = 0.0
+
+    @property
+    def up(self) -> bool:
+        return time.monotonic() >= self.down_until
+
+    def failed(self, error: Exception) -> None:
+        if isinstance(error, (ConnectionError, TimeoutError, OSError)):
+            if self.up:
+                metrics.incr("redis.marked_down")
+            self.down_until = time.monotonic() + self.cooldown
+
+
+availability = Availability()
+
+
+async def connect() -> Optional[Redis]:
+    """
+    Shared redis connection for the chat service, or None when REDIS_HOST is unset.
+
+    A client is returned even if the first ping fails, redis-py reconnects on
+    the next command and every caller falls back to process-local behaviour
+    while redis is unavailable. Failed commands aren't retried, callers have a
+    fallback and `availability` keeps them off redis until it recovers.
+    """
+    host = os.getenv("REDIS_HOST")
+    if not host:
+        logger.info("REDIS_HOST not set, running without redis")
+        return None
+
+    client = _client(host, env_float("CHAT_REDIS_TIMEOUT", 1))
+    try:
+        await client.ping()
+        logger.success("Connected to redis cache")
+    except Exception as e:
+        logger.warning(f"Redis not reachable yet: {e}")
+    return client
+
+
+def blocking_client(block: float) -> Optional[Redis]:
+    """
+    Separate connection for blocking reads such as `XREADGROUP BLOCK`.
+
+    The shared client's socket timeout is shorter than a block, reads waiting
+    on an idle stream would time out. This one allows `block` seconds on top.
+    """
+    host = os.getenv("REDIS_HOST")
+    if not host:
+        return None
+    return _client(host, env_float("CHAT_REDIS_TIMEOUT", 1) + block)
+
+
+def _client(host: str, socket_timeout: float) -> Redis:
+    return Redis(
+        host=host,
+        port=env_int("REDIS_PORT", 6379),
+        password=os.getenv("REDIS_PASSWORD"),
+        decode_responses=True,
+        socket_timeout=socket_timeout,
+        socket_connect_timeout=env_float("CHAT_REDIS_TIMEOUT", 1),
+        retry=Retry(NoBackoff(), 0),
+    )
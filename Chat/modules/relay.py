@@ -0,0 +1,148 @@
+import asyncio
+import json
+import os
+import socket
+import time
+from typing import Any, Dict, List, Optional
+
+from loguru import logger
+from redis.asyncio import Redis
+from redis.exceptions import ResponseError, TimeoutError
+
+from . import redis_conn
+from .hub import RedisHub
+from .metrics import metrics
+from .settings import env, env_float, env_int
+
+TO_DISCORD_STREAM = env("CHAT_TO_DISCORD_STREAM", "chat:to_discord")
+TO_RUNELITE_STREAM = env("CHAT_TO_RUNELITE_STREAM", "chat:to_runelite")
+
+
+class ChatRelay:
+    """
+    Redis stream transport between chat and the discord bot.
+
+    Deduped chat entries are appended to TO_DISCORD_STREAM, one stream entry
+    per forwarded batch. Frames the bot appends to TO_RUNELITE_STREAM are read
+    through a consumer group shared by every chat worker, so each frame is
+    picked up once and fanned out to all workers through the hub. Reads block
+    for up to `block` seconds on a connection of their own.
+
+    Consumer names change with every restart, so entries a dead worker read
+    but never acked are claimed by a live one once they have been idle for
+    `claim_idle` seconds, checked every `claim_interval` seconds.
+    """
+
+    group = "chat"
+
+    def __init__(
+        self,
+        hub: RedisHub,
+        maxlen: int = env_int("CHAT_RELAY_MAXLEN", 10000),
+        block: float = env_float("CHAT_RELAY_BLOCK", 5),
+        claim_idle: float = env_float("CHAT_RELAY_CLAIM_IDLE", 60),
+        claim_interval: float = env_float("CHAT_RELAY_CLAIM_INTERVAL", 30),
+    ):
+        self.hub = hub
+        self.maxlen = maxlen
+        self.block = block
+        self.claim_idle = claim_idle
+        self.claim_interval = claim_interval
+        self.client: Optional[Redis] = None
+        self.reader: Optional[Redis] = None
+        self.consumer = f"{socket.gethostname()}-{os.getpid()}"
+        self.task: Optional[asyncio.Task] = None
+
+    def start(self, client: Optional[Redis]) -> None:
+        self.client = client
+        if client and not self.task:
+            self.reader = redis_conn.blocking_client(self.block)
+            self.task = asyncio.create_task(self._consume())
+
+    async def forward(self, entries: List[Dict[str, Any]]) -> None:
+        if not self.client:
+            raise RuntimeError("Redis unavailable, cannot relay chat entries")
+        await self.client.xadd(
+            TO_DISCORD_STREAM,
+            {"entries": json.dumps(entries, separators=(",", ":"))},
+            maxlen=self.maxlen,
+            approximate=True,
+        )
+        metrics.incr("relay.to_discord", len(entries))
+
+    async def _ensure_group(self) -> None:
+        try:
+            await self.reader.xgroup_create(
+                TO_RUNELITE_STREAM, self.group, id="$", mkstream=True
+            )
+        except ResponseError as e:
+            if "BUSYGROUP" not in str(e):
+                raise
+
+    async def _claim_stale(self) -> List[Any]:
+        """Take over entries other consumers read but left unacked."""
+        response = await self.reader.xautoclaim(
+            TO_RUNELITE_STREAM,
+            self.group,
+            self.consumer,
+            min_idle_time=int(self.claim_idle * 1000),
+            start_id="0-0",
+            count=100,
+        )
+        # Entries trimmed from the stream come back without fields
+        claimed = [(entry_id, fields) for entry_id, fields in response[1] if fields]
+        if claimed:
+            logger.info(f"Claimed {len(claimed)} stale relay entries")
+            metrics.incr("relay.claimed", len(claimed))
+        return claimed
+
+    async def _relay(self, entries: List[Any]) -> None:
+        for entry_id, fields in entries:
+            try:
+                await self.hub.publish(json.loads(fields["payload"]))
+                metrics.incr("relay.to_runelite")
+            except (KeyError, ValueError) as e:
+                logger.warning(f"Dropping malformed relay entry {entry_id}: {e}")
+            await self.reader.xack(TO_RUNELITE_STREAM, self.group, entry_id)
+
+    async def _consume(self) -> None:
+        # Start with our own pending entries in case we died before acking
+        last_id = "0"
+        last_claim = 0.0
+        while True:
+            try:
+                if last_id == "0":
+                    await self._ensure_group()
+                if time.monotonic() - last_claim >= self.claim_interval:
+                    last_claim = time.monotonic()
+                    await self._relay(await self._claim_stale())
+                response = await self.reader.xreadgroup(
+                    self.group,
+                    self.consumer,
+                    {TO_RUNELITE_STREAM: last_id},
+                    count=100,
+                    block=int(self.block * 1000),
+                )
+                entries = response[0][1] if response else []
+                if last_id == "0" and not entries:
+                    last_id = ">"
+                    continue
+                await self._relay(entries)
+            except asyncio.CancelledError:
+                raise
+            except TimeoutError:
+                # A slow reply, not a failure, carry on from where we were
+                metrics.incr("relay.read_timeouts")
+            except Exception as e:
+                logger.warning(f"Relay consumer error, retrying: {e}")
+                last_id = "0"
+                await asyncio.sleep(5)
+
+    async def close(self) -> None:
+        if self.task:
+            self.task.cancel()
+            await asyncio.gather(self.task, return_exceptions=True)
+            self.task = None
+        if self.reader:
+            await self.reader.aclose()
+            self.reader = None